@@ -0,0 +1,151 @@
+from typing import Sequence
+
+import numpy as np
+
+from chess_puzzle import \
+    Board, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_DIRECTIONS, is_checkmate
+
+# Boards are packed into a bool array of shape (N, 6, size, size) with
+# one plane per side and piece type, White's K, R, B then Black's, and
+# the piece at x, y of board n at [n, plane, y - 1, x - 1].
+# Results per side are indexed 0 for White and 1 for Black.
+LETTERS = ('K', 'R', 'B')
+SIDES = (True, False)
+
+
+def plane_index(side: bool, letter: str) -> int:
+    return 3 * SIDES.index(side) + LETTERS.index(letter)
+
+
+def pack_boards(boards: Sequence[Board]) -> np.ndarray:
+    '''Packs boards, which must all have the same size, into piece planes.
+    Example:
+    >>> from chess_puzzle import read_board
+    >>> planes = pack_boards([read_board('board_examp.txt')])
+    >>> planes.shape
+    (1, 6, 5, 5)
+    >>> int(planes[0, plane_index(True, 'K')].argmax())  # Kc5
+    22
+    '''
+    if not boards:
+        raise ValueError('no boards to pack')
+    size = boards[0][0]
+    planes = np.zeros((len(boards), 6, size, size), dtype=bool)
+    for n, (board_size, pieces) in enumerate(boards):
+        if board_size != size:
+            raise ValueError('boards must all be the same size')
+        for piece in pieces:
+            plane = plane_index(piece.side, piece.letter)
+            planes[n, plane, piece.pos_y - 1, piece.pos_x - 1] = True
+    return planes
+
+
+def shift(squares: np.ndarray, dx: int, dy: int) -> np.ndarray:
+    '''Moves every square dx along x and dy along y in the last two axes,
+    dropping squares that leave the board'''
+    size = squares.shape[-1]
+    shifted = np.zeros_like(squares)
+    dest_y = slice(max(dy, 0), size + min(dy, 0))
+    dest_x = slice(max(dx, 0), size + min(dx, 0))
+    src_y = slice(max(-dy, 0), size + min(-dy, 0))
+    src_x = slice(max(-dx, 0), size + min(-dx, 0))
+    shifted[..., dest_y, dest_x] = squares[..., src_y, src_x]
+    return shifted
+
+
+def rays(pieces: np.ndarray, empty: np.ndarray,
+         dx: int, dy: int) -> np.ndarray:
+    '''Squares reached sliding from pieces in direction dx, dy: the empty
+    squares passed over and the first occupied square met, as walk_rays
+    finds them before removing squares of its own side'''
+    ray = shift(pieces, dx, dy)
+    reached = ray.copy()
+    for _ in range(pieces.shape[-1] - 2):
+        ray = shift(ray & empty, dx, dy)
+        if not ray.any():
+            break
+        reached |= ray
+    return reached
+
+
+def side_moves(planes: np.ndarray, side: bool) -> list[np.ndarray]:
+    '''Squares reached by the pieces of side, as one array per direction
+    per piece type. Squares of both sides are included.
+    Within one array no square is reached by two pieces, since a ray
+    stops at the first piece on it, so counting the squares of every
+    array counts each move once.'''
+    empty = np.asarray(~planes.any(axis=1), dtype=bool)
+    kings = planes[:, plane_index(side, 'K')]
+    rooks = planes[:, plane_index(side, 'R')]
+    bishops = planes[:, plane_index(side, 'B')]
+    reached = [shift(kings, dx, dy) for dx, dy in KING_DIRECTIONS]
+    reached += [rays(rooks, empty, dx, dy) for dx, dy in ROOK_DIRECTIONS]
+    reached += [rays(bishops, empty, dx, dy)
+                for dx, dy in BISHOP_DIRECTIONS]
+    return reached
+
+
+def own_squares(planes: np.ndarray, side: bool) -> np.ndarray:
+    start = 3 * SIDES.index(side)
+    return np.asarray(planes[:, start:start + 3].any(axis=1), dtype=bool)
+
+
+def attack_maps(planes: np.ndarray) -> np.ndarray:
+    '''Returns bool array (N, 2, size, size) of the squares each side
+    attacks, including squares of its own pieces that it defends.
+    Example:
+    >>> from chess_puzzle import read_board
+    >>> attacks = attack_maps(pack_boards([read_board('board_examp.txt')]))
+    >>> bool(attacks[0, 1, 2, 4])  # Black's rook on d3 attacks e3
+    True
+    >>> bool(attacks[0, 1, 4, 2])  # but no Black piece attacks c5
+    False
+    '''
+    return np.stack([np.logical_or.reduce(side_moves(planes, side))
+                     for side in SIDES], axis=1)
+
+
+def check_flags(planes: np.ndarray) -> np.ndarray:
+    '''Returns bool array (N, 2) of whether each side is in check, the
+    same as is_check(side, board) for every board.
+    Example:
+    >>> from chess_puzzle import read_board
+    >>> check_flags(pack_boards([read_board('board_examp.txt')]))
+    array([[False, False]])
+    '''
+    attacks = attack_maps(planes)
+    flags = []
+    for i, side in enumerate(SIDES):
+        king = planes[:, plane_index(side, 'K')]
+        flags.append((attacks[:, 1 - i] & king).any(axis=(1, 2)))
+    return np.stack(flags, axis=1)
+
+
+def pseudo_legal_counts(planes: np.ndarray) -> np.ndarray:
+    '''Returns int array (N, 2) of the number of moves each side has
+    ignoring [Rule5], which is the sum over its pieces of
+    len(piece.get_destinations(board)).
+    Example:
+    >>> from chess_puzzle import read_board
+    >>> pseudo_legal_counts(pack_boards([read_board('board_examp.txt')]))
+    array([[19, 22]])
+    '''
+    counts = []
+    for side in SIDES:
+        not_own = ~own_squares(planes, side)
+        counts.append(sum((reached & not_own).sum(axis=(1, 2))
+                          for reached in side_moves(planes, side)))
+    return np.stack(counts, axis=1)
+
+
+def checkmate_flags(boards: Sequence[Board],
+                    planes: np.ndarray) -> np.ndarray:
+    '''Returns bool array (N, 2) of whether each side is checkmated. Check
+    is found for all boards at once, then is_checkmate is called only for
+    the boards where a side is in check, which are usually few.'''
+    checks = check_flags(planes)
+    mates = np.zeros_like(checks)
+    for n, i in zip(*np.nonzero(checks)):
+        mates[n, i] = is_checkmate(SIDES[i], boards[n])
+    return mates
+
@@ -0,0 +1,353 @@
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from functools import partial
+from io import StringIO
+from typing import Any, Callable, NamedTuple
+
+from chess_puzzle import \
+    Board, Bishop, King, Rook, PieceList, board_to_txt, conf2unicode, \
+    get_all_moves, is_check, is_checkmate, is_piece_at, read_board, \
+    read_board_txt
+
+BOARD_FILES = ['board_small_valid.txt', 'board_examp.txt',
+               'board_large_fair.txt', 'board_large_white_adv.txt']
+SIZES = (4, 8, 12, 20, 26)
+# pieces on each generated board, kings included, where they fit in half
+# the squares
+PIECE_COUNTS = (2, 8, 16, 32)
+FUNCTIONS = ('read_board_txt', 'is_piece_at', 'can_move_to', 'is_check',
+             'get_all_moves', 'is_checkmate', 'conf2unicode')
+# each sample times calls for at least this long, so the timer's own
+# overhead does not swamp quick functions
+MIN_SAMPLE_NS = 20000
+
+# timings that can be compared with a baseline
+METRICS = ('p50_ns', 'p99_ns')
+# slow down relative to the baseline allowed before compare fails
+REGRESSION_THRESHOLD = 0.25
+
+# one benchmark result: function, size, pieces, ops_per_sec, p50_ns,
+# p99_ns and samples, written as JSON
+Result = dict[str, Any]
+# saved results: function -> size -> pieces -> timings, keys as strings
+Baseline = dict[str, dict[str, dict[str, dict[str, float]]]]
+
+
+class TimingParams(NamedTuple):
+    '''Options that decide which boards and arguments are timed. Timings
+    are only compared with a baseline made with the same ones.'''
+    sizes: tuple[int, ...]
+    samples: int
+    seed: int
+
+
+def bytes_per_board(filename: str, count: int = 1000) -> float:
+    '''Reads the board in filename count times, keeping every copy, and
+    returns the memory allocated per board as measured by tracemalloc.
+    This covers the PieceList with its square index as well as the
+    pieces themselves.'''
+    board_txt = board_to_txt(read_board(filename))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        boards: list[Board] = [read_board_txt(StringIO(board_txt))
+                               for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / len(boards)
+
+
+def run_memory(count: int) -> None:
+    print(f"{'board':<28}{'pieces':>8}{'bytes/board':>14}")
+    for filename in BOARD_FILES:
+        pieces = len(read_board(filename)[1])
+        print(f'{filename:<28}{pieces:>8}'
+              f'{bytes_per_board(filename, count):>14.0f}')
+
+
+def generate_board(size: int, pieces: int, rng: random.Random) -> Board:
+    '''Board of size with a king for each side and pieces - 2 rooks and
+    bishops, sides alternating, on random squares. Either side may be in
+    check.
+    Example:
+    >>> b = generate_board(8, 16, random.Random(0))
+    >>> b[0], len(b[1]), sum(p.side for p in b[1])
+    (8, 16, 8)
+    '''
+    squares = rng.sample([(x, y) for x in range(1, size + 1)
+                          for y in range(1, size + 1)], pieces)
+    board: Board = (size, PieceList())
+    for i, (x, y) in enumerate(squares):
+        side = i % 2 == 0
+        if i < 2:
+            board[1].append(King(x, y, side))
+        else:
+            board[1].append(rng.choice([Rook, Bishop])(x, y, side))
+    return board
+
+
+def parse_board_txt(board_txt: str) -> Board:
+    'reads board_txt with read_board_txt, from a new stream each call'
+    return read_board_txt(StringIO(board_txt))
+
+
+def make_ops(function: str, boards: list[Board],
+             rng: random.Random) -> list[Callable[[], object]]:
+    '''One call of function for each board, with random arguments where
+    it takes any'''
+    ops: list[Callable[[], object]] = []
+    for board in boards:
+        size = board[0]
+        side = rng.choice([True, False])
+        if function == 'read_board_txt':
+            ops.append(partial(parse_board_txt, board_to_txt(board)))
+        elif function == 'is_piece_at':
+            x = rng.randint(1, size)
+            y = rng.randint(1, size)
+            ops.append(partial(is_piece_at, x, y, board))
+        elif function == 'can_move_to':
+            piece = rng.choice(board[1])
+            x = rng.randint(1, size)
+            y = rng.randint(1, size)
+            ops.append(partial(piece.can_move_to, x, y, board))
+        elif function == 'is_check':
+            ops.append(partial(is_check, side, board))
+        elif function == 'get_all_moves':
+            ops.append(partial(get_all_moves, side, board))
+        elif function == 'is_checkmate':
+            ops.append(partial(is_checkmate, side, board))
+        elif function == 'conf2unicode':
+            ops.append(partial(conf2unicode, board))
+        else:
+            raise ValueError(f"unknown function '{function}'")
+    return ops
+
+
+def time_ops(ops: list[Callable[[], object]]) -> list[float]:
+    '''Times each op after one call to warm up, repeating it enough
+    times to last MIN_SAMPLE_NS, and returns nanoseconds per call'''
+    samples = []
+    for op in ops:
+        # first call builds any lookup tables for the board size
+        op()
+        repeat = 1
+        while True:
+            start = time.perf_counter_ns()
+            for _ in range(repeat):
+                op()
+            elapsed = time.perf_counter_ns() - start
+            if elapsed >= MIN_SAMPLE_NS:
+                break
+            repeat *= 2
+        samples.append(elapsed / repeat)
+    return samples
+
+
+def percentile(sorted_samples: list[float], p: float) -> float:
+    '''Nearest rank percentile of samples already sorted
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 50), percentile([1.0, 2.0], 99)
+    (2.0, 2.0)
+    '''
+    rank = max(1, -(-len(sorted_samples) * p // 100))
+    return sorted_samples[int(rank) - 1]
+
+
+def run_benchmarks(sizes: tuple[int, ...] = SIZES,
+                   functions: tuple[str, ...] = FUNCTIONS,
+                   samples: int = 50, seed: int = 0) -> list[Result]:
+    '''Times each function on samples generated boards for every size and
+    piece count. The same seed gives the same boards and arguments.
+    Example:
+    >>> results = run_benchmarks((4,), ('is_check',), samples=5)
+    >>> [(r['function'], r['size'], r['pieces']) for r in results]
+    [('is_check', 4, 2), ('is_check', 4, 8)]
+    '''
+    results = []
+    for size in sizes:
+        for pieces in PIECE_COUNTS:
+            if pieces > size * size // 2:
+                continue
+            rng = random.Random(f'{seed}-{size}-{pieces}')
+            boards = [generate_board(size, pieces, rng)
+                      for _ in range(samples)]
+            for function in functions:
+                timings = time_ops(make_ops(function, boards, rng))
+                timings.sort()
+                results.append({
+                    'function': function,
+                    'size': size,
+                    'pieces': pieces,
+                    'ops_per_sec': round(1e9 * len(timings) / sum(timings),
+                                         1),
+                    'p50_ns': round(percentile(timings, 50), 1),
+                    'p99_ns': round(percentile(timings, 99), 1),
+                    'samples': len(timings),
+                })
+    return results
+
+
+def save_baseline(path: str, results: list[Result],
+                  params: TimingParams) -> None:
+    '''Writes params and results to path as JSON, the results keyed by
+    function, then board size, then piece count'''
+    baseline: Baseline = {}
+    for r in results:
+        sizes = baseline.setdefault(r['function'], {})
+        sizes.setdefault(str(r['size']), {})[str(r['pieces'])] = {
+            key: r[key] for key in ('ops_per_sec', 'samples') + METRICS}
+    with open(path, 'w') as f:
+        json.dump({'params': params._asdict(), 'results': baseline}, f,
+                  indent=2, sort_keys=True)
+
+
+def load_baseline(path: str) -> tuple[TimingParams, Baseline]:
+    '''Returns the params and results saved by save_baseline. Raises
+    IOError if the file was not written by it.'''
+    with open(path) as f:
+        data = json.load(f)
+    try:
+        saved = data['params']
+        params = TimingParams(tuple(saved['sizes']), saved['samples'],
+                              saved['seed'])
+        baseline: Baseline = data['results']
+    except (KeyError, TypeError):
+        raise IOError(f"'{path}' is not a baseline file")
+    return params, baseline
+
+
+class Change(NamedTuple):
+    '''Timing of one function, size and piece count against the baseline.
+    ratio is new time over baseline time, so above 1 is slower.'''
+    function: str
+    size: int
+    pieces: int
+    baseline_ns: float
+    new_ns: float
+
+    @property
+    def ratio(self) -> float:
+        return self.new_ns / self.baseline_ns
+
+
+def compare_results(baseline: Baseline, results: list[Result],
+                    metric: str = 'p50_ns') -> list[Change]:
+    '''Pairs each result with the baseline timing for the same function,
+    size and piece count, skipping results the baseline does not have.
+    Example:
+    >>> baseline = {'is_check': {'8': {'2': {'p50_ns': 100.0}}}}
+    >>> result = {'function': 'is_check', 'size': 8, 'pieces': 2,
+    ...           'p50_ns': 150.0}
+    >>> [change.ratio for change in compare_results(baseline, [result])]
+    [1.5]
+    '''
+    changes = []
+    for r in results:
+        old = baseline.get(r['function'], {}).get(str(r['size']), {}) \
+            .get(str(r['pieces']))
+        if old is not None:
+            changes.append(Change(r['function'], r['size'], r['pieces'],
+                                  old[metric], r[metric]))
+    return changes
+
+
+def print_changes(changes: list[Change], threshold: float) -> None:
+    print(f"{'function':<16}{'size':>5}{'pieces':>7}{'baseline ns':>13}"
+          f"{'new ns':>11}{'change':>9}")
+    for c in changes:
+        flag = '  REGRESSION' if c.ratio > 1 + threshold else ''
+        print(f'{c.function:<16}{c.size:>5}{c.pieces:>7}'
+              f'{c.baseline_ns:>13.0f}{c.new_ns:>11.0f}'
+              f'{c.ratio - 1:>+9.0%}{flag}')
+    regressions = sum(1 for c in changes if c.ratio > 1 + threshold)
+    print(f'\n{regressions} of {len(changes)} slower than baseline by more '
+          f'than {threshold:.0%}')
+
+
+def run_compare(path: str, results: list[Result], params: TimingParams,
+                threshold: float = REGRESSION_THRESHOLD,
+                metric: str = 'p50_ns') -> int:
+    '''Compares results, timed with params, against the baseline at path
+    and returns the exit status: 1 if the baseline was made with other
+    params, has none of the results, or any result is slower than it by
+    more than threshold, otherwise 0.'''
+    baseline_params, baseline = load_baseline(path)
+    if params != baseline_params:
+        print(f'baseline was made with {baseline_params}, not {params}',
+              file=sys.stderr)
+        return 1
+    changes = compare_results(baseline, results, metric)
+    if not changes:
+        print('no results to compare with the baseline', file=sys.stderr)
+        return 1
+    print_changes(changes, threshold)
+    return int(any(change.ratio > 1 + threshold for change in changes))
+
+
+def print_table(results: list[Result]) -> None:
+    print(f"{'function':<16}{'size':>5}{'pieces':>7}{'ops/sec':>13}"
+          f"{'p50 ns':>11}{'p99 ns':>11}")
+    for r in results:
+        print(f"{r['function']:<16}{r['size']:>5}{r['pieces']:>7}"
+              f"{r['ops_per_sec']:>13.0f}{r['p50_ns']:>11.0f}"
+              f"{r['p99_ns']:>11.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Chess puzzle benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+    memory = commands.add_parser('memory', help='bytes per board')
+    memory.add_argument('--count', type=int, default=1000,
+                        help='boards held in memory at once')
+    # options for timing, shared by run, baseline and compare
+    timing = argparse.ArgumentParser(add_help=False)
+    timing.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='board sizes to generate')
+    timing.add_argument('--functions', nargs='+', default=FUNCTIONS,
+                        choices=FUNCTIONS, help='functions to time')
+    timing.add_argument('--samples', type=int, default=50,
+                        help='boards generated per size and piece count')
+    timing.add_argument('--seed', type=int, default=0)
+    run = commands.add_parser('run', parents=[timing],
+                              help='time the rule functions')
+    run.add_argument('--json', action='store_true',
+                     help='print results as JSON instead of a table')
+    baseline = commands.add_parser('baseline', parents=[timing],
+                                   help='time the rule functions and save '
+                                   + 'the results as a baseline')
+    baseline.add_argument('path', help='baseline file to write')
+    compare = commands.add_parser('compare', parents=[timing],
+                                  help='time the rule functions and exit '
+                                  + 'with status 1 if any is slower than '
+                                  + 'the baseline by more than threshold, '
+                                  + 'or if none can be compared with it')
+    compare.add_argument('path', help='baseline file to compare with')
+    compare.add_argument('--threshold', type=float,
+                         default=REGRESSION_THRESHOLD,
+                         help='allowed slow down, eg. 0.25 for 25%%')
+    compare.add_argument('--metric', choices=METRICS, default='p50_ns',
+                         help='timing to compare')
+    args = parser.parse_args()
+    if args.command == 'memory':
+        run_memory(args.count)
+        sys.exit(0)
+    params = TimingParams(tuple(args.sizes), args.samples, args.seed)
+    results = run_benchmarks(params.sizes, tuple(args.functions),
+                             params.samples, params.seed)
+    if args.command == 'run':
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            print_table(results)
+    elif args.command == 'baseline':
+        save_baseline(args.path, results, params)
+        print(f'{len(results)} results saved to {args.path}')
+    else:
+        sys.exit(run_compare(args.path, results, params, args.threshold,
+                             args.metric))
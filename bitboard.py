@@ -0,0 +1,241 @@
+from functools import lru_cache
+from typing import Iterator
+
+from chess_puzzle import \
+    Board, Piece, Bishop, King, Rook, PieceList, KING_DIRECTIONS, \
+    ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+
+# piece letters in the order their bitboards are stored
+LETTERS = ('K', 'R', 'B')
+CONSTRUCTORS = {'K': King, 'R': Rook, 'B': Bishop}
+
+# a move given as source x, y then destination x, y
+BitMove = tuple[int, int, int, int]
+
+
+class RayTables:
+    '''Lookup tables for one board size. Squares are numbered from 0 as
+    (y - 1) * size + (x - 1) so bit n of a bitboard is square n.
+    rays maps each direction to a list giving, for every square, the mask
+    of squares along that direction up to the edge of the board.
+    neighbors gives the mask of squares a king can step to.'''
+    size: int
+    rays: dict[tuple[int, int], list[int]]
+    # True if square numbers increase going along the direction
+    ascending: dict[tuple[int, int], bool]
+    neighbors: list[int]
+
+    def __init__(self, size: int):
+        self.size = size
+        self.rays = {}
+        self.ascending = {}
+        for dx, dy in KING_DIRECTIONS:
+            masks = []
+            for sq in range(size * size):
+                x = sq % size + dx
+                y = sq // size + dy
+                mask = 0
+                while 0 <= x < size and 0 <= y < size:
+                    mask |= 1 << (y * size + x)
+                    x += dx
+                    y += dy
+                masks.append(mask)
+            self.rays[(dx, dy)] = masks
+            self.ascending[(dx, dy)] = dy * size + dx > 0
+        self.neighbors = []
+        for sq in range(size * size):
+            mask = 0
+            for direction in KING_DIRECTIONS:
+                # first square of each ray is the neighbor
+                ray = self.rays[direction][sq]
+                if ray:
+                    mask |= lowest_bit(ray) if self.ascending[direction] \
+                        else highest_bit(ray)
+            self.neighbors.append(mask)
+
+    def slider_attacks(self, sq: int,
+                       directions: tuple[tuple[int, int], ...],
+                       occupied: int) -> int:
+        '''Returns mask of squares attacked from sq along directions. Each
+        ray is cut off beyond the first occupied square, which is itself
+        included since it may be captured.'''
+        attacks = 0
+        for direction in directions:
+            ray = self.rays[direction][sq]
+            blockers = ray & occupied
+            if blockers:
+                if self.ascending[direction]:
+                    first = lowest_bit(blockers)
+                else:
+                    first = highest_bit(blockers)
+                ray ^= self.rays[direction][first.bit_length() - 1]
+            attacks |= ray
+        return attacks
+
+
+@lru_cache(maxsize=None)
+def get_tables(size: int) -> RayTables:
+    'returns the lookup tables for size, building them on first use'
+    return RayTables(size)
+
+
+def lowest_bit(mask: int) -> int:
+    return mask & -mask
+
+
+def highest_bit(mask: int) -> int:
+    return 1 << (mask.bit_length() - 1)
+
+
+def iter_squares(mask: int) -> Iterator[int]:
+    'yields the square number of each set bit, lowest first'
+    while mask:
+        bit = mask & -mask
+        yield bit.bit_length() - 1
+        mask ^= bit
+
+
+class BitBoard:
+    '''Alternative board backend holding one Python int per side and piece
+    type, with one bit per square, for any size from 2 to 26. Gives the
+    same answers as is_check, is_checkmate and get_all_moves in
+    chess_puzzle, but moves are (x0, y0, x1, y1) tuples and get_all_moves
+    sorts them rather than listing them by order of the pieces.
+    Boards are immutable: moved returns a new BitBoard.
+    Example:
+    >>> from chess_puzzle import read_board
+    >>> bb = BitBoard.from_board(read_board('board_small_valid.txt'))
+    >>> bb.is_check(True), bb.is_checkmate(True)
+    (False, False)
+    >>> bb.get_all_moves(False)[:3]
+    [(1, 4, 1, 2), (1, 4, 1, 3), (1, 4, 2, 4)]
+    '''
+    size: int
+    tables: RayTables
+    # bitboards indexed by (side, letter)
+    bits: dict[tuple[bool, str], int]
+    occupied: dict[bool, int]
+
+    def __init__(self, size: int, bits: dict[tuple[bool, str], int]):
+        self.size = size
+        self.tables = get_tables(size)
+        self.bits = bits
+        self.occupied = {}
+        for side in (True, False):
+            occ = 0
+            for letter in LETTERS:
+                occ |= bits[(side, letter)]
+            self.occupied[side] = occ
+
+    @staticmethod
+    def from_board(B: Board) -> 'BitBoard':
+        size = B[0]
+        bits = {(side, letter): 0
+                for side in (True, False) for letter in LETTERS}
+        for piece in B[1]:
+            sq = (piece.pos_y - 1) * size + piece.pos_x - 1
+            bits[(piece.side, piece.letter)] |= 1 << sq
+        return BitBoard(size, bits)
+
+    def to_board(self) -> Board:
+        '''Converts back to the object based board, listing white pieces
+        before black and each side by piece type then square.'''
+        pieces: PieceList = PieceList()
+        for side in (True, False):
+            for letter in LETTERS:
+                for sq in iter_squares(self.bits[(side, letter)]):
+                    x, y = self.coords(sq)
+                    pieces.append(CONSTRUCTORS[letter](x, y, side))
+        return self.size, pieces
+
+    def coords(self, sq: int) -> tuple[int, int]:
+        'converts square number to 1-based x, y coordinates'
+        return sq % self.size + 1, sq // self.size + 1
+
+    def piece_attacks(self, letter: str, sq: int) -> int:
+        'returns mask of squares attacked by a piece of type letter on sq'
+        occupied = self.occupied[True] | self.occupied[False]
+        if letter == 'K':
+            return self.tables.neighbors[sq]
+        elif letter == 'R':
+            return self.tables.slider_attacks(sq, ROOK_DIRECTIONS, occupied)
+        else:
+            return self.tables.slider_attacks(sq, BISHOP_DIRECTIONS, occupied)
+
+    def attacked_by(self, side: bool) -> int:
+        'returns mask of all squares attacked by pieces of side'
+        attacks = 0
+        for letter in LETTERS:
+            for sq in iter_squares(self.bits[(side, letter)]):
+                attacks |= self.piece_attacks(letter, sq)
+        return attacks
+
+    def attackers(self, sq: int, side: bool, occupied: int,
+                  captured: int = 0) -> int:
+        '''Returns mask of the pieces of side that attack sq when the
+        squares in occupied are filled, leaving out any piece of side on
+        the captured squares. Rays are cast out from sq, so this costs
+        the same however many pieces there are.'''
+        rooks = self.bits[(side, 'R')] & ~captured
+        bishops = self.bits[(side, 'B')] & ~captured
+        kings = self.bits[(side, 'K')] & ~captured
+        tables = self.tables
+        return (tables.neighbors[sq] & kings) \
+            | (tables.slider_attacks(sq, ROOK_DIRECTIONS, occupied) & rooks) \
+            | (tables.slider_attacks(sq, BISHOP_DIRECTIONS, occupied)
+               & bishops)
+
+    def is_check(self, side: bool) -> bool:
+        king_sq = self.bits[(side, 'K')].bit_length() - 1
+        occupied = self.occupied[True] | self.occupied[False]
+        return bool(self.attackers(king_sq, not side, occupied))
+
+    def moved(self, move: BitMove) -> 'BitBoard':
+        '''Returns the board after move, which is assumed to be valid'''
+        x0, y0, x1, y1 = move
+        src = 1 << ((y0 - 1) * self.size + x0 - 1)
+        dest = 1 << ((y1 - 1) * self.size + x1 - 1)
+        bits = self.bits.copy()
+        for key, mask in bits.items():
+            if mask & src:
+                bits[key] = mask ^ src | dest
+            elif mask & dest:
+                # captured piece
+                bits[key] = mask ^ dest
+        return BitBoard(self.size, bits)
+
+    def iter_moves(self, side: bool) -> Iterator[BitMove]:
+        '''Yields the legal moves of side one at a time, in square order.
+        Each move is tested by updating the occupancy mask and looking for
+        attackers of the king square, without building the new board.'''
+        own = self.occupied[side]
+        occupied = own | self.occupied[not side]
+        king_sq = self.bits[(side, 'K')].bit_length() - 1
+        sources: list[tuple[int, str]] = []
+        for letter in LETTERS:
+            sources.extend((sq, letter)
+                           for sq in iter_squares(self.bits[(side, letter)]))
+        sources.sort()
+        for sq, letter in sources:
+            x0, y0 = self.coords(sq)
+            for dest in iter_squares(self.piece_attacks(letter, sq) & ~own):
+                dest_bit = 1 << dest
+                after = occupied & ~(1 << sq) | dest_bit
+                target = dest if letter == 'K' else king_sq
+                if not self.attackers(target, not side, after, dest_bit):
+                    x1, y1 = self.coords(dest)
+                    yield x0, y0, x1, y1
+
+    def get_all_moves(self, side: bool) -> list[BitMove]:
+        return sorted(self.iter_moves(side))
+
+    def is_checkmate(self, side: bool) -> bool:
+        if not self.is_check(side):
+            return False
+        return next(self.iter_moves(side), None) is None
+
+
+def move_to_bitmove(move: tuple[Piece, int, int]) -> BitMove:
+    '''Converts a move from chess_puzzle.get_all_moves to BitMove form'''
+    piece, x, y = move
+    return piece.pos_x, piece.pos_y, x, y
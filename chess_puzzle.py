@@ -1,7 +1,15 @@
 import argparse
+import json
+import os
 import random
+import sys
 import readline
-from typing import TextIO, Optional
+import time
+from functools import lru_cache, wraps
+from io import StringIO
+from typing import \
+    Any, Callable, Iterable, Iterator, NamedTuple, Optional, SupportsIndex, \
+    TextIO, Union, overload
 
 # if not blank need to include trailing slash in FILEPATH
 FILEPATH = ''
@@ -12,6 +20,39 @@ CMD_QUIT = 'QUIT'
 PLAY_AGAINST_COMPUTER = True
 # seed can be set for test reproducibility
 RANDOM_SEED: Optional[int] = None
+# (dx, dy) steps that each piece type moves along
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KING_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+# fixed seed so every process generates the same Zobrist hash keys
+ZOBRIST_SEED = 0x5EED
+# how many plies the computer looks ahead, 0 means play a random move
+SEARCH_DEPTH = 2
+# if set, computer searches deeper and deeper for this many milliseconds
+# instead of using SEARCH_DEPTH
+SEARCH_BUDGET_MS: Optional[int] = None
+# evaluation weights, mobility counts one per square a piece can reach
+PIECE_VALUES = {'K': 0, 'R': 50, 'B': 30}
+MOBILITY_WEIGHT = 1
+MATE_SCORE = 100000
+# memory the computer player's transposition table may use
+TT_MEMORY_BYTES = 8 * 2**20
+# reasons a game ends, see GameResult
+CHECKMATE = 'checkmate'
+NO_MOVES = 'no moves'
+QUIT = 'quit'
+MAX_PLIES = 'max plies'
+# directory of endgame tables (see tablebase.py) the computer player uses
+# for positions they cover, None to always search
+TABLEBASE_DIR: Optional[str] = None
+# functions and methods that instrumentation counts and times
+INSTRUMENTED_FUNCTIONS = ('is_check', 'get_all_moves', 'king_safety',
+                          'is_piece_at', 'piece_at', 'evaluate')
+INSTRUMENTED_METHODS = ('can_reach', 'can_move_to', 'is_leap_over',
+                        'walk_rays', 'negamax')
+# environment variable that turns on instrumentation when set to 1, the
+# same as the --instrument flag
+INSTRUMENT_ENV = 'CHESS_INSTRUMENT'
 
 
 def location2index(loc: str) -> tuple[int, int]:
@@ -44,13 +85,81 @@ def index2location(x: int, y: int) -> str:
     letter = chr(x - 1 + ord('a'))
     return f'{letter}{y}'
 
+# squares of a board, nearest first, along each direction from a square
+Rays = dict[tuple[int, int], tuple[tuple[int, int], ...]]
+
+
+class RayTable(NamedTuple):
+    '''Lookup tables for one board size, shared by every board of that
+    size. rays maps each square (x, y) to its Rays, which give for each
+    of the 8 directions the squares up to the edge of the board.
+    neighbors maps each square to the squares a king can step to.'''
+    size: int
+    rays: dict[tuple[int, int], Rays]
+    neighbors: dict[tuple[int, int], frozenset[tuple[int, int]]]
+
+
+@lru_cache(maxsize=None)
+def ray_table(size: int) -> RayTable:
+    '''Returns the tables for size, building them the first time.
+    Example:
+    >>> ray_table(4).rays[(2, 3)][(1, -1)]
+    ((3, 2), (4, 1))
+    >>> sorted(ray_table(4).neighbors[(1, 1)])
+    [(1, 2), (2, 1), (2, 2)]
+    '''
+    # one tuple per square, reused by every ray that passes through it
+    squares = {(x, y): (x, y)
+               for x in range(1, size + 1) for y in range(1, size + 1)}
+    rays = {}
+    neighbors = {}
+    for x0, y0 in squares:
+        square_rays = {}
+        for dx, dy in KING_DIRECTIONS:
+            ray = []
+            x = x0 + dx
+            y = y0 + dy
+            while 0 < x <= size and 0 < y <= size:
+                ray.append(squares[(x, y)])
+                x += dx
+                y += dy
+            square_rays[(dx, dy)] = tuple(ray)
+        rays[(x0, y0)] = square_rays
+        neighbors[(x0, y0)] = frozenset(ray[0] for ray in square_rays.values()
+                                        if ray)
+    return RayTable(size, rays, neighbors)
+
+
+def squares_between(x0: int, y0: int, x1: int, y1: int,
+                    size: int) -> tuple[tuple[int, int], ...]:
+    '''Returns the squares strictly between two squares on the same row,
+    column or diagonal of a board of size, nearest (x0, y0) first.
+    Example:
+    >>> squares_between(1, 1, 4, 4, 5)
+    ((2, 2), (3, 3))
+    '''
+    dist = max(abs(x1 - x0), abs(y1 - y0))
+    if dist <= 1:
+        return ()
+    dx = (x1 > x0) - (x1 < x0)
+    dy = (y1 > y0) - (y1 < y0)
+    return ray_table(size).rays[(x0, y0)][(dx, dy)][:dist - 1]
+
 
 class Piece:
+    # only the position and side are stored per piece, everything else
+    # is shared by all pieces of a class
+    __slots__ = ('pos_x', 'pos_y', 'side')
     pos_x: int
     pos_y: int
     side: bool  # True for White and False for Black
-    unicode: str
+    # class level: letter used in board files, unicode symbol for each
+    # side, steps the piece moves along and whether it can slide more
+    # than one square in a direction
     letter: str
+    symbols: dict[bool, str]
+    directions: tuple[tuple[int, int], ...]
+    slides: bool
 
     def __init__(self, pos_X: int, pos_Y: int, side_: bool):
         '''sets initial values'''
@@ -61,6 +170,11 @@ class Piece:
         self.pos_y = pos_Y
         self.side = side_
 
+    @property
+    def unicode(self) -> str:
+        '''symbol for this piece in unicode board configurations'''
+        return self.symbols[self.side]
+
     # type hint 'Board' is in quotes because it cannot be defined until
     # Piece has been defined (forward reference)
     @staticmethod
@@ -154,6 +268,59 @@ class Piece:
             return piece.side == self.side
         return False
 
+    def set_position(self, pos_X: int, pos_Y: int, B: 'Board') -> None:
+        '''Places this piece at pos_X, pos_Y without any validation and
+        updates the square index and hash of B if the board has them.
+        Any piece already at the destination must be removed from B
+        beforehand.
+        '''
+        pieces = B[1]
+        if isinstance(pieces, PieceList):
+            pieces._unindex(self)
+        self.pos_x = pos_X
+        self.pos_y = pos_Y
+        if isinstance(pieces, PieceList):
+            pieces._index(self)
+
+    def walk_rays(self, directions: tuple[tuple[int, int], ...],
+                  slide: bool, B: 'Board') -> list[tuple[int, int]]:
+        '''Walks from this piece along each direction, stopping at the edge
+        of the board or the first piece met, which is included if it can
+        be captured. If slide is False only one step is taken. Returns the
+        squares reached sorted by x then y, the same order as a scan over
+        the whole board would find them. Example:
+        >>> b = read_board('board_small_valid.txt')
+        >>> Rc3 = piece_at(3, 3, b)
+        >>> Rc3.walk_rays(ROOK_DIRECTIONS, True, b)
+        [(3, 1), (3, 2), (3, 4), (4, 3)]
+        '''
+        squares = []
+        rays = ray_table(B[0]).rays[(self.pos_x, self.pos_y)]
+        for direction in directions:
+            for x, y in rays[direction]:
+                if is_piece_at(x, y, B):
+                    if piece_at(x, y, B).side != self.side:
+                        squares.append((x, y))
+                    break
+                squares.append((x, y))
+                if not slide:
+                    break
+        squares.sort()
+        return squares
+
+    def exposes_king(self, pos_X: int, pos_Y: int, B: 'Board') -> bool:
+        '''Checks [Rule5] by temporarily making the move of this piece to
+        pos_X, pos_Y and testing whether its own king is then in check.
+        Assumes the destination is reachable. Board B is left unchanged.
+        '''
+        undo = make_move(self, pos_X, pos_Y, B)
+        in_check = is_check(self.side, B)
+        unmake_move(undo, B)
+        return in_check
+
+    def get_destinations(self, B: 'Board') -> list[tuple[int, int]]:
+        '''Abstract method needs listing here to avoid Mypy warnings.
+        '''
     def can_reach(self, pos_X: int, pos_Y: int, B: 'Board') -> bool:
         '''Abstract method needs listing here to avoid Mypy warnings.
         '''
@@ -188,6 +355,178 @@ class Piece:
 Board = tuple[int, list[Piece]]
 
 
+def _make_zobrist_keys() -> tuple[dict[tuple[str, bool], list[int]],
+                                  list[int], int]:
+    '''Generates random 64 bit keys for each piece type and side on each
+    square of the largest board, one key per board size and one key for
+    Black to move.'''
+    rng = random.Random(ZOBRIST_SEED)
+    piece_keys = {}
+    for letter in 'KRB':
+        for side in (True, False):
+            piece_keys[(letter, side)] = [rng.getrandbits(64)
+                                          for _ in range(26 * 26)]
+    size_keys = [rng.getrandbits(64) for _ in range(27)]
+    return piece_keys, size_keys, rng.getrandbits(64)
+
+
+ZOBRIST_PIECES, ZOBRIST_SIZES, ZOBRIST_BLACK_TO_MOVE = _make_zobrist_keys()
+
+
+def zobrist_key(piece: Piece) -> int:
+    '''Returns the Zobrist key for piece on its current square. Squares
+    are numbered as on a 26x26 board so keys work for every size.'''
+    square = (piece.pos_y - 1) * 26 + piece.pos_x - 1
+    return ZOBRIST_PIECES[(piece.letter, piece.side)][square]
+
+
+class PieceList(list[Piece]):
+    '''List of pieces that also keeps an index of the occupied squares,
+    so that is_piece_at and piece_at are constant time lookups.
+    The index is kept in sync by every method that changes the list, and
+    by Piece.set_position when a piece changes square. A board may still be
+    built from a plain list, in which case lookups fall back to a scan.
+    The list position of each piece is also tracked so that make_move can
+    take a captured piece out in constant time with swap_remove, and the
+    Zobrist hash of the pieces is updated incrementally (see board_hash).
+    Example:
+    >>> pieces = PieceList([King(4, 2, True)])
+    >>> pieces.append(Rook(1, 1, True))
+    >>> pieces.squares[(1, 1)]
+    Rook(1, 1, white)
+    '''
+    squares: dict[tuple[int, int], Piece]
+    # maps id(piece) to its index in the list
+    positions: dict[int, int]
+    # xor of zobrist_key of every piece
+    zobrist: int
+    # board_hash and legal moves saved by legal_move_set, cleared by
+    # move_to
+    move_set: Optional[tuple[int, dict[str, tuple[Piece, int, int]]]]
+
+    def __init__(self, pieces: Iterable[Piece] = ()):
+        super().__init__(pieces)
+        self.move_set = None
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        'recalculates the square index, list positions and hash'
+        self.squares = {}
+        self.zobrist = 0
+        for piece in self:
+            self._index(piece)
+        self.positions = {}
+        self._reindex_from(0)
+
+    def _reindex_from(self, start: int) -> None:
+        'recalculates list positions of pieces from index start onwards'
+        for i in range(start, len(self)):
+            self.positions[id(self[i])] = i
+
+    def _index(self, piece: Piece) -> None:
+        'adds piece to the square index and hash'
+        self.squares[(piece.pos_x, piece.pos_y)] = piece
+        self.zobrist ^= zobrist_key(piece)
+
+    def _unindex(self, piece: Piece) -> None:
+        'removes piece from index, only if it is the piece on its square'
+        key = (piece.pos_x, piece.pos_y)
+        if self.squares.get(key) is piece:
+            del self.squares[key]
+            self.zobrist ^= zobrist_key(piece)
+
+    def append(self, piece: Piece) -> None:
+        super().append(piece)
+        self._index(piece)
+        self.positions[id(piece)] = len(self) - 1
+
+    def insert(self, index: SupportsIndex, piece: Piece) -> None:
+        super().insert(index, piece)
+        self._index(piece)
+        # inserting is linear time anyway, so simply reindex everything
+        self._reindex_from(0)
+
+    def pop(self, index: SupportsIndex = -1) -> Piece:
+        piece = super().pop(index)
+        self._unindex(piece)
+        idx = self.positions.pop(id(piece))
+        self._reindex_from(idx)
+        return piece
+
+    def remove(self, piece: Piece) -> None:
+        idx = self.index(piece)
+        self.pop(idx)
+
+    def extend(self, pieces: Iterable[Piece]) -> None:
+        for piece in pieces:
+            self.append(piece)
+
+    def _extend_in_place(self, pieces: Iterable[Piece]) -> 'PieceList':
+        self.extend(pieces)
+        return self
+
+    # assigned rather than defined as __iadd__, as mypy rejects += giving
+    # a PieceList when + on the list type gives a plain list
+    __iadd__ = _extend_in_place
+
+    @overload
+    def __setitem__(self, index: SupportsIndex, piece: Piece) -> None: ...
+
+    @overload
+    def __setitem__(self, index: slice, pieces: Iterable[Piece]) -> None: ...
+
+    def __setitem__(self, index: Union[SupportsIndex, slice],
+                    pieces: Any) -> None:
+        super().__setitem__(index, pieces)
+        self._rebuild()
+
+    def __delitem__(self, index: Union[SupportsIndex, slice]) -> None:
+        super().__delitem__(index)
+        self._rebuild()
+
+    def clear(self) -> None:
+        super().clear()
+        self._rebuild()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        super().sort(*args, **kwargs)
+        self._reindex_from(0)
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._reindex_from(0)
+
+    def swap_remove(self, piece: Piece) -> int:
+        '''Removes piece in constant time by moving the last piece of the
+        list into its place. Returns the index the piece was at, which
+        swap_restore needs to put the list back in its original order.'''
+        idx = self.positions.pop(id(piece))
+        last = super().pop()
+        if last is not piece:
+            super().__setitem__(idx, last)
+            self.positions[id(last)] = idx
+        self._unindex(piece)
+        return idx
+
+    def swap_restore(self, piece: Piece, idx: int) -> None:
+        '''Reverses swap_remove, putting piece back at index idx.'''
+        if idx < len(self):
+            moved = self[idx]
+            super().append(moved)
+            self.positions[id(moved)] = len(self) - 1
+            super().__setitem__(idx, piece)
+        else:
+            super().append(piece)
+        self.positions[id(piece)] = idx
+        self._index(piece)
+
+    def __reduce__(self) -> tuple[type['PieceList'], tuple[list[Piece]]]:
+        '''Pickles and copies only the pieces, so the square index, list
+        positions and hash are rebuilt for the new piece objects rather
+        than copied with the ids of the old ones.'''
+        return PieceList, (list(self),)
+
+
 def is_piece_at(pos_X: int, pos_Y: int, B: Board) -> bool:
     '''Checks if there is piece at coordinates pox_X, pos_Y of board B.
     Assumes that x and y will always be within bounds and does not check.
@@ -198,6 +537,8 @@ def is_piece_at(pos_X: int, pos_Y: int, B: Board) -> bool:
     True
     '''
     size, pieces = B
+    if isinstance(pieces, PieceList):
+        return (pos_X, pos_Y) in pieces.squares
     return any(p.pos_x == pos_X and p.pos_y == pos_Y for p in pieces)
 
 
@@ -211,6 +552,8 @@ def piece_at(pos_X: int, pos_Y: int, B: Board) -> Piece:
     >>> piece_at(1, 1, b)
     Rook(1, 1, white)
     '''
+    if isinstance(B[1], PieceList):
+        return B[1].squares[(pos_X, pos_Y)]
     for piece in B[1]:
         if piece.pos_x == pos_X and piece.pos_y == pos_Y:
             break
@@ -218,12 +561,107 @@ def piece_at(pos_X: int, pos_Y: int, B: Board) -> Piece:
     return piece
 
 
+def board_hash(side: bool, B: Board) -> int:
+    '''Returns the Zobrist hash of board B with side to move. The same
+    position always gives the same hash, in any process. Constant time
+    when the pieces are a PieceList, which keeps its hash up to date as
+    pieces move, otherwise the hash is calculated from scratch.
+    Example:
+    >>> b = read_board('board_examp.txt')
+    >>> h = board_hash(True, b)
+    >>> h != board_hash(False, b)
+    True
+    >>> Rd3 = piece_at(4, 3, b)
+    >>> h == board_hash(True, Rd3.move_to(4, 2, b))
+    False
+    >>> h == board_hash(True, Rd3.move_to(4, 3, b))
+    True
+    '''
+    size, pieces = B
+    if isinstance(pieces, PieceList):
+        key = pieces.zobrist
+    else:
+        key = 0
+        for piece in pieces:
+            key ^= zobrist_key(piece)
+    key ^= ZOBRIST_SIZES[size]
+    if not side:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    return key
+
+
+class Undo(NamedTuple):
+    '''Record returned by make_move holding what unmake_move needs to
+    restore the board: the piece moved, the square it came from, and
+    the piece captured (if any) with its index in the list of pieces.'''
+    piece: Piece
+    from_x: int
+    from_y: int
+    captured: Optional[Piece]
+    captured_idx: int
+
+
+def make_move(piece: Piece, pos_X: int, pos_Y: int, B: Board) -> Undo:
+    '''Moves piece to pos_X, pos_Y on board B, capturing any piece there,
+    and returns the record needed by unmake_move to take the move back.
+    Assumes the move is valid according to chess rules. On a board whose
+    pieces are a PieceList this is constant time: a captured piece is
+    swapped out with the last piece instead of being removed from the
+    middle of the list, so the order of B[1] only comes back once the
+    move is unmade. Callers keep their own stack of records and must
+    unmake moves in reverse order.
+    Example:
+    >>> b = read_board('board_small_valid.txt')
+    >>> Ra4 = piece_at(1, 4, b)
+    >>> undo = make_move(Ra4, 1, 2, b)
+    >>> undo.captured
+    Bishop(1, 2, white)
+    >>> piece_at(1, 2, b)
+    Rook(1, 2, black)
+    >>> unmake_move(undo, b)
+    >>> b == read_board('board_small_valid.txt')
+    True
+    '''
+    pieces = B[1]
+    captured = None
+    idx = -1
+    if is_piece_at(pos_X, pos_Y, B):
+        captured = piece_at(pos_X, pos_Y, B)
+        if isinstance(pieces, PieceList):
+            idx = pieces.swap_remove(captured)
+        else:
+            idx = next(i for i, p in enumerate(pieces) if p is captured)
+            pieces.pop(idx)
+    undo = Undo(piece, piece.pos_x, piece.pos_y, captured, idx)
+    piece.set_position(pos_X, pos_Y, B)
+    return undo
+
+
+def unmake_move(undo: Undo, B: Board) -> None:
+    '''Takes back a move made by make_move, restoring board B exactly,
+    including the order of its list of pieces.'''
+    piece, from_x, from_y, captured, idx = undo
+    piece.set_position(from_x, from_y, B)
+    if captured is not None:
+        pieces = B[1]
+        if isinstance(pieces, PieceList):
+            pieces.swap_restore(captured, idx)
+        else:
+            pieces.insert(idx, captured)
+
+
 class Rook(Piece):
-    def __init__(self, pos_X: int, pos_Y: int, side_: bool):
-        '''sets initial values by calling the constructor of Piece'''
-        super().__init__(pos_X, pos_Y, side_)
-        self.unicode = '\u2656' if side_ else '\u265C'
-        self.letter = 'R'
+    __slots__ = ()
+    letter = 'R'
+    symbols = {True: '\u2656', False: '\u265C'}
+    directions = ROOK_DIRECTIONS
+    slides = True
+
+    def get_destinations(self, B: Board) -> list[tuple[int, int]]:
+        '''Returns the squares this rook can reach on board B according
+        to [Rule2] and [Rule4], found by walking its rays.
+        Does not check whether the move leaves the king in check.'''
+        return self.walk_rays(self.directions, self.slides, B)
 
     def can_reach(self, pos_X: int, pos_Y: int, B: Board) -> bool:
         '''
@@ -265,28 +703,8 @@ class Rook(Piece):
         ...
         Rb4 can move -> (2, 2)
         '''
-        captured_piece = None
-        if self.can_reach(pos_X, pos_Y, B):
-            if is_piece_at(pos_X, pos_Y, B):
-                captured_piece = piece_at(pos_X, pos_Y, B)
-                idx_captured = B[1].index(captured_piece)
-                B[1].pop(idx_captured)
-
-            # temporarily move the piece to see if in check
-            orig_X = self.pos_x
-            orig_Y = self.pos_y
-            self.pos_x = pos_X
-            self.pos_y = pos_Y
-            is_valid = not is_check(self.side, B)
-
-            # reverse move and replace captured piece
-            self.pos_x = orig_X
-            self.pos_y = orig_Y
-            if captured_piece is not None:
-                B[1].insert(idx_captured, captured_piece)
-            return is_valid
-        else:
-            return False
+        return self.can_reach(pos_X, pos_Y, B) \
+            and not self.exposes_king(pos_X, pos_Y, B)
 
     def move_to(self, pos_X: int, pos_Y: int, B: Board) -> Board:
         '''
@@ -300,8 +718,8 @@ class Rook(Piece):
         if is_piece_at(pos_X, pos_Y, B):
             captured_piece = piece_at(pos_X, pos_Y, B)
             B[1].remove(captured_piece)
-        self.pos_x = pos_X
-        self.pos_y = pos_Y
+        self.set_position(pos_X, pos_Y, B)
+        clear_move_set(B)
         return B
 
     def in_defined_moves(self, pos_X: int, pos_Y: int) -> bool:
@@ -326,29 +744,23 @@ class Rook(Piece):
         >>> Ra4.is_leap_over(1, 1, b)
         True
         '''
-        is_same_row = self.pos_y == pos_Y
-        is_same_column = self.pos_x == pos_X
-        if is_same_row:
-            # important 1 + ...
-            start = 1 + min(self.pos_x, pos_X)
-            stop = max(self.pos_x, pos_X)
-            path = ((x, pos_Y) for x in range(start, stop))
-        elif is_same_column:
-            # important 1 + ...
-            start = 1 + min(self.pos_y, pos_Y)
-            stop = max(self.pos_y, pos_Y)
-            path = ((pos_X, y) for y in range(start, stop))
+        path = squares_between(self.pos_x, self.pos_y, pos_X, pos_Y, B[0])
         # path does not include final destination or starting square
-        # path may also be in reverse order
         return any(is_piece_at(x, y, B) for x, y in path)
 
 
 class Bishop(Piece):
-    def __init__(self, pos_X: int, pos_Y: int, side_: bool):
-        '''sets initial values by calling the constructor of Piece'''
-        super().__init__(pos_X, pos_Y, side_)
-        self.unicode = '\u2657' if side_ else '\u265D'
-        self.letter = 'B'
+    __slots__ = ()
+    letter = 'B'
+    symbols = {True: '\u2657', False: '\u265D'}
+    directions = BISHOP_DIRECTIONS
+    slides = True
+
+    def get_destinations(self, B: Board) -> list[tuple[int, int]]:
+        '''Returns the squares this bishop can reach on board B according
+        to [Rule1] and [Rule4], found by walking its rays.
+        Does not check whether the move leaves the king in check.'''
+        return self.walk_rays(self.directions, self.slides, B)
 
     def can_reach(self, pos_X: int, pos_Y: int, B: Board) -> bool:
         '''checks if this bishop can move to coordinates pos_X, pos_Y on
@@ -378,28 +790,8 @@ class Bishop(Piece):
         ...
         Bc2 can move -> (1, 4)
         '''
-        captured_piece = None
-        if self.can_reach(pos_X, pos_Y, B):
-            if is_piece_at(pos_X, pos_Y, B):
-                captured_piece = piece_at(pos_X, pos_Y, B)
-                idx_captured = B[1].index(captured_piece)
-                B[1].pop(idx_captured)
-
-            # temporarily move the piece to see if in check
-            orig_X = self.pos_x
-            orig_Y = self.pos_y
-            self.pos_x = pos_X
-            self.pos_y = pos_Y
-            is_valid = not is_check(self.side, B)
-
-            # reverse move and replace captured piece
-            self.pos_x = orig_X
-            self.pos_y = orig_Y
-            if captured_piece is not None:
-                B[1].insert(idx_captured, captured_piece)
-            return is_valid
-        else:
-            return False
+        return self.can_reach(pos_X, pos_Y, B) \
+            and not self.exposes_king(pos_X, pos_Y, B)
 
     def move_to(self, pos_X: int, pos_Y: int, B: Board) -> Board:
         '''
@@ -413,8 +805,8 @@ class Bishop(Piece):
         if is_piece_at(pos_X, pos_Y, B):
             captured_piece = piece_at(pos_X, pos_Y, B)
             B[1].remove(captured_piece)
-        self.pos_x = pos_X
-        self.pos_y = pos_Y
+        self.set_position(pos_X, pos_Y, B)
+        clear_move_set(B)
         return B
 
     def in_defined_moves(self, pos_X: int, pos_Y: int) -> bool:
@@ -438,35 +830,23 @@ class Bishop(Piece):
         >>> Ba2.is_leap_over(3, 4, b)
         True
         '''
-        # important 1 + or - ...
-        if self.pos_x <= pos_X:
-            start_x = self.pos_x + 1
-            step = 1
-        else:
-            start_x = self.pos_x - 1
-            step = -1
-        x_range = range(start_x, pos_X, step)
-
-        # important 1 + or - ...
-        if self.pos_y <= pos_Y:
-            start_y = self.pos_y + 1
-            step = 1
-        else:
-            start_y = self.pos_y - 1
-            step = -1
-        y_range = range(start_y, pos_Y, step)
-
-        path = ((x, y) for x, y in zip(x_range, y_range))
+        path = squares_between(self.pos_x, self.pos_y, pos_X, pos_Y, B[0])
         # path does not include final destination or starting square
         return any(is_piece_at(x, y, B) for x, y in path)
 
 
 class King(Piece):
-    def __init__(self, pos_X: int, pos_Y: int, side_: bool):
-        '''sets initial values by calling the constructor of Piece'''
-        super().__init__(pos_X, pos_Y, side_)
-        self.unicode = '\u2654' if side_ else '\u265A'
-        self.letter = 'K'
+    __slots__ = ()
+    letter = 'K'
+    symbols = {True: '\u2654', False: '\u265A'}
+    directions = KING_DIRECTIONS
+    slides = False
+
+    def get_destinations(self, B: Board) -> list[tuple[int, int]]:
+        '''Returns the squares this king can reach on board B according
+        to [Rule3] and [Rule4], found by walking its rays.
+        Does not check whether the move leaves the king in check.'''
+        return self.walk_rays(self.directions, self.slides, B)
 
     def can_reach(self, pos_X: int, pos_Y: int, B: Board) -> bool:
         '''checks if this king can move to coordinates pos_X, pos_Y on
@@ -495,28 +875,8 @@ class King(Piece):
         ...
         Kd4 can move -> (3, 4)
         '''
-        captured_piece = None
-        if self.can_reach(pos_X, pos_Y, B):
-            if is_piece_at(pos_X, pos_Y, B):
-                captured_piece = piece_at(pos_X, pos_Y, B)
-                idx_captured = B[1].index(captured_piece)
-                B[1].pop(idx_captured)
-
-            # temporarily move the piece to see if in check
-            orig_X = self.pos_x
-            orig_Y = self.pos_y
-            self.pos_x = pos_X
-            self.pos_y = pos_Y
-            is_valid = not is_check(self.side, B)
-
-            # reverse move and replace captured piece
-            self.pos_x = orig_X
-            self.pos_y = orig_Y
-            if captured_piece is not None:
-                B[1].insert(idx_captured, captured_piece)
-            return is_valid
-        else:
-            return False
+        return self.can_reach(pos_X, pos_Y, B) \
+            and not self.exposes_king(pos_X, pos_Y, B)
 
     def move_to(self, pos_X: int, pos_Y: int, B: Board) -> Board:
         '''
@@ -530,8 +890,8 @@ class King(Piece):
         if is_piece_at(pos_X, pos_Y, B):
             captured_piece = piece_at(pos_X, pos_Y, B)
             B[1].remove(captured_piece)
-        self.pos_x = pos_X
-        self.pos_y = pos_Y
+        self.set_position(pos_X, pos_Y, B)
+        clear_move_set(B)
         return B
 
     def in_defined_moves(self, pos_X: int, pos_Y: int) -> bool:
@@ -555,6 +915,151 @@ def is_check(side: bool, B: Board) -> bool:
     return any(p.can_reach(king.pos_x, king.pos_y, B) for p in pieces)
 
 
+class KingSafety(NamedTuple):
+    '''Facts about the king of one side computed once per position, so
+    that candidate moves can be accepted or rejected by geometry alone
+    rather than by making each move and calling is_check.
+    attacked: squares the other side attacks, found with this king taken
+    off the board so it cannot step back along the line of a check.
+    checkers: pieces of the other side giving check.
+    block_squares: squares that answer a single check, which are the
+    square of the checker and any squares between it and the king.
+    pins: maps id() of each pinned piece to the squares it may still
+    move to, which are the squares between the king and the pinner
+    together with the square of the pinner.'''
+    king: Piece
+    attacked: set[tuple[int, int]]
+    checkers: list[Piece]
+    block_squares: set[tuple[int, int]]
+    pins: dict[int, set[tuple[int, int]]]
+
+    def allows(self, piece: Piece, pos_X: int, pos_Y: int) -> bool:
+        '''Checks [Rule5] for a move of piece that satisfies the other
+        rules, ie. one returned by piece.get_destinations.'''
+        if piece is self.king:
+            return (pos_X, pos_Y) not in self.attacked
+        if len(self.checkers) > 1:
+            # only the king can escape a double check
+            return False
+        if self.checkers and (pos_X, pos_Y) not in self.block_squares:
+            return False
+        pin_ray = self.pins.get(id(piece))
+        return pin_ray is None or (pos_X, pos_Y) in pin_ray
+
+
+def attacks_along(piece: Piece, dx: int, dy: int, dist: int) -> bool:
+    '''Returns true if piece attacks a square dist steps away from it in
+    direction (dx, dy), assuming no pieces stand in between.'''
+    return (dx, dy) in piece.directions and (piece.slides or dist == 1)
+
+
+def king_safety(side: bool, B: Board) -> KingSafety:
+    '''Finds the attacked squares, checkers and pins for the king of side.
+    Example:
+    >>> from io import StringIO
+    >>> b = read_board_txt(StringIO("""4
+    ... Kd2, Ra1, Bb2
+    ... Rb4, Kd4"""))
+    >>> info = king_safety(False, b)
+    >>> info.checkers
+    [Bishop(2, 2, white)]
+    >>> sorted(info.block_squares)
+    [(2, 2), (3, 3)]
+    >>> info.pins
+    {}
+    '''
+    king = next(p for p in B[1] if type(p) is King and p.side == side)
+    kx, ky = king.pos_x, king.pos_y
+
+    # squares attacked by the other side, looking through the king
+    table = ray_table(B[0])
+    attacked: set[tuple[int, int]] = set()
+    for piece in B[1]:
+        if piece.side == side:
+            continue
+        if not piece.slides:
+            attacked.update(table.neighbors[(piece.pos_x, piece.pos_y)])
+            continue
+        rays = table.rays[(piece.pos_x, piece.pos_y)]
+        for direction in piece.directions:
+            for x, y in rays[direction]:
+                attacked.add((x, y))
+                if is_piece_at(x, y, B) and not (x == kx and y == ky):
+                    break
+
+    # checks and pins, found by walking out from the king
+    checkers = []
+    block_squares: set[tuple[int, int]] = set()
+    pins = {}
+    king_rays = table.rays[(kx, ky)]
+    for dx, dy in KING_DIRECTIONS:
+        ray = []
+        own_piece = None
+        for x, y in king_rays[(dx, dy)]:
+            ray.append((x, y))
+            if is_piece_at(x, y, B):
+                piece = piece_at(x, y, B)
+                if piece.side == side:
+                    if own_piece is not None:
+                        break
+                    own_piece = piece
+                else:
+                    # enemy piece looks back at the king along -dx, -dy
+                    if attacks_along(piece, -dx, -dy, len(ray)):
+                        if own_piece is None:
+                            checkers.append(piece)
+                            block_squares.update(ray)
+                        else:
+                            pins[id(own_piece)] = set(ray)
+                    break
+    return KingSafety(king, attacked, checkers, block_squares, pins)
+
+
+def iter_legal_moves(
+        side: bool, B: Board,
+        info: KingSafety) -> Iterator[tuple[Piece, int, int]]:
+    '''Yields the moves of side that satisfy [Rule5] according to info,
+    in the same order as get_all_moves, finding each piece's moves only
+    when the moves before them have been used. B must not change while
+    the moves are being used.'''
+    double_check = len(info.checkers) > 1
+    for piece in B[1]:
+        if piece.side != side:
+            continue
+        if double_check and piece is not info.king:
+            # only the king can escape a double check
+            continue
+        for x, y in piece.get_destinations(B):
+            if info.allows(piece, x, y):
+                yield piece, x, y
+
+
+def legal_moves(
+        side: bool, B: Board,
+        info: KingSafety) -> list[tuple[Piece, int, int]]:
+    '''Returns all moves of side that satisfy [Rule5] according to info,
+    in the same order as get_all_moves.'''
+    return list(iter_legal_moves(side, B, info))
+
+
+def has_any_legal_move(side: bool, B: Board,
+                       info: Optional[KingSafety] = None) -> bool:
+    '''Checks whether side has at least one move, stopping at the first
+    one found rather than listing them all. info is found from B if not
+    given.
+    Example:
+    >>> from io import StringIO
+    >>> b = read_board_txt(StringIO("""4
+    ... Ka1
+    ... Kc2, Bb3"""))
+    >>> has_any_legal_move(True, b), has_any_legal_move(False, b)
+    (False, True)
+    '''
+    if info is None:
+        info = king_safety(side, B)
+    return next(iter_legal_moves(side, B, info), None) is not None
+
+
 def is_checkmate(side: bool, B: Board) -> bool:
     '''
     checks if configuration of B is checkmate for side
@@ -563,7 +1068,8 @@ def is_checkmate(side: bool, B: Board) -> bool:
     - use is_check
     - use can_reach
     '''
-    return is_check(side, B) and len(get_all_moves(side, B)) == 0
+    info = king_safety(side, B)
+    return len(info.checkers) > 0 and not has_any_legal_move(side, B, info)
 
 
 def get_all_moves(side: bool, B: Board) -> list[tuple[Piece, int, int]]:
@@ -582,16 +1088,44 @@ def get_all_moves(side: bool, B: Board) -> list[tuple[Piece, int, int]]:
     Rook(4, 1, white) -> (4, 3)
     Rook(4, 1, white) -> (4, 4)
     '''
-    size = B[0]
-    moves = []
-    for piece in filter(lambda x: x.side == side, B[1]):
-        for x in range(1, size + 1):
-            for y in range(1, size + 1):
-                if piece.can_move_to(x, y, B):
-                    moves.append((piece, x, y))
+    return legal_moves(side, B, king_safety(side, B))
+
+
+def legal_move_set(
+        side: bool, B: Board) -> dict[str, tuple[Piece, int, int]]:
+    '''Returns the moves of side as a dict from their text, eg. 'a1b2', to
+    the move. They are found with get_all_moves the first time and kept
+    on the pieces of B until a piece moves with move_to, so checking a
+    move typed in is one dict lookup for the rest of the turn. Boards
+    whose pieces are a plain list are not cached.
+    Example:
+    >>> b = read_board('board_small_valid.txt')
+    >>> moves = legal_move_set(True, b)
+    >>> sorted(moves)[:4]
+    ['a1b1', 'a1c1', 'a1d1', 'a2b1']
+    >>> moves['a1b1']
+    (Rook(1, 1, white), 2, 1)
+    >>> legal_move_set(True, b) is moves
+    True
+    '''
+    pieces = B[1]
+    key = board_hash(side, B)
+    if isinstance(pieces, PieceList) and pieces.move_set is not None:
+        cached_key, moves = pieces.move_set
+        if cached_key == key:
+            return moves
+    moves = {move_to_txt(move): move for move in get_all_moves(side, B)}
+    if isinstance(pieces, PieceList):
+        pieces.move_set = (key, moves)
     return moves
 
 
+def clear_move_set(B: Board) -> None:
+    '''Forgets the moves saved by legal_move_set, once a piece moves'''
+    if isinstance(B[1], PieceList):
+        B[1].move_set = None
+
+
 def read_board(filename: str) -> Board:
     '''
     Reads board configuration from file in current directory in plain format.
@@ -645,7 +1179,7 @@ def read_board_txt(stream: TextIO) -> Board:
         raise IOError(f"'{line1}' {MSG_IOERROR}")
 
     # populate white pieces
-    board: Board = (size, [])
+    board: Board = (size, PieceList())
     white_data = tolerant_readline(stream)
     Piece.create_pieces(white_data, True, board)
 
@@ -655,8 +1189,11 @@ def read_board_txt(stream: TextIO) -> Board:
     return board
 
 
-def save_board(filename: str, B: Board) -> None:
-    '''saves board configuration into file in current directory in plain format
+def board_to_txt(B: Board) -> str:
+    '''Converts board B to the plain format read by read_board_txt.
+    Example:
+    >>> board_to_txt((4, [King(4, 2, True), King(4, 4, False)]))
+    '4\\nKd2\\nKd4\\n'
     '''
     size = B[0]
     lines = [f'{size}\n', '', '']
@@ -668,9 +1205,650 @@ def save_board(filename: str, B: Board) -> None:
     # remove trailing comma at end
     lines[1] = lines[1][:-2] + '\n'
     lines[2] = lines[2][:-2] + '\n'
+    return ''.join(lines)
+
+
+def save_board(filename: str, B: Board) -> None:
+    '''saves board configuration into file in current directory in plain format
+    '''
     fullname = FILEPATH + filename
     with open(fullname, 'x') as f:
-        f.writelines(lines)
+        f.write(board_to_txt(B))
+
+
+class BoardRecord(NamedTuple):
+    '''One board read by iter_boards_txt or iter_boards_jsonl. line is the
+    line number, from 1, that the record starts on. Exactly one of board
+    and error is set.'''
+    line: int
+    board: Optional[Board]
+    error: Optional[IOError]
+
+
+def parse_record(line_num: int, board_txt: str) -> BoardRecord:
+    '''Reads board_txt with read_board_txt, catching IOError and adding
+    line_num to its message'''
+    try:
+        board = read_board_txt(StringIO(board_txt))
+    except IOError as e:
+        return BoardRecord(line_num, None, IOError(f'line {line_num}: {e}'))
+    return BoardRecord(line_num, board, None)
+
+
+def iter_boards_txt(stream: Iterable[str]) -> Iterator[BoardRecord]:
+    '''Reads boards one at a time from a stream of plain format boards
+    placed one after another, with blank lines between them allowed.
+    Each line holding only digits, the board size, starts a new record,
+    so a board with a missing or extra line is an error that does not
+    affect the boards after it. Only one record is held in memory at a
+    time. A record is an error unless it has exactly 3 lines.
+    Example:
+    >>> stream = StringIO("""4
+    ... Kd2
+    ...
+    ... 4
+    ... Kd2
+    ... Kd4
+    ... """)
+    >>> for record in iter_boards_txt(stream):
+    ...     print(record.line, record.board or record.error)
+    1 line 1: board file input/output is not valid
+    4 (4, [King(4, 2, white), King(4, 4, black)])
+    '''
+    def record(start: int, lines: list[str]) -> BoardRecord:
+        if len(lines) != 3:
+            return BoardRecord(start, None,
+                               IOError(f'line {start}: board {MSG_IOERROR}'))
+        return parse_record(start, '\n'.join(lines))
+
+    lines: list[str] = []
+    start = 0
+    for line_num, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line.isdigit() and lines:
+            yield record(start, lines)
+            lines = []
+        if not lines:
+            start = line_num
+        lines.append(line)
+    if lines:
+        yield record(start, lines)
+
+
+def iter_boards_jsonl(stream: Iterable[str]) -> Iterator[BoardRecord]:
+    '''Reads boards one at a time from a stream with one JSON string per
+    line, each holding a board in plain format. Blank lines are skipped.
+    Example:
+    >>> stream = StringIO('"4\\\\nKd2\\\\nKd4"\\n{"size": 4}\\n')
+    >>> for record in iter_boards_jsonl(stream):
+    ...     print(record.line, record.board or record.error)
+    1 (4, [King(4, 2, white), King(4, 4, black)])
+    2 line 2: board file input/output is not valid
+    '''
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            board_txt = json.loads(line)
+        except ValueError:
+            board_txt = None
+        if not isinstance(board_txt, str):
+            yield BoardRecord(line_num, None,
+                              IOError(f'line {line_num}: board {MSG_IOERROR}'))
+            continue
+        yield parse_record(line_num, board_txt)
+
+
+def read_boards(filename: str) -> Iterator[BoardRecord]:
+    '''Reads every board in filename in current directory, one at a time.
+    Files ending .jsonl are read with iter_boards_jsonl, others with
+    iter_boards_txt. Raises FileNotFoundError if the file cannot be
+    located.'''
+    fullname = FILEPATH + filename
+    with open(fullname, 'r') as f:
+        if filename.endswith('.jsonl'):
+            yield from iter_boards_jsonl(f)
+        else:
+            yield from iter_boards_txt(f)
+
+
+def evaluate(side: bool, B: Board) -> int:
+    '''Scores board B from the point of view of side as material plus
+    mobility, the number of squares each piece can reach, of side minus
+    that of the other side.
+    Example:
+    >>> b = read_board('board_small_valid.txt')
+    >>> evaluate(True, b) == -evaluate(False, b)
+    True
+    '''
+    score = 0
+    for piece in B[1]:
+        value = PIECE_VALUES[piece.letter] \
+            + MOBILITY_WEIGHT * len(piece.get_destinations(B))
+        score += value if piece.side == side else -value
+    return score
+
+
+class SearchResult(NamedTuple):
+    '''Outcome of a search: best move found (None if there are no moves)
+    with its score for the side to move, and throughput statistics.'''
+    move: Optional[tuple[Piece, int, int]]
+    score: int
+    depth: int
+    nodes: int
+    seconds: float
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        move = 'none' if self.move is None else move_to_txt(self.move)
+        return (f'depth {self.depth} score {self.score} move {move} '
+                f'nodes {self.nodes} time {self.seconds:.3f}s '
+                f'nps {self.nodes_per_second:.0f}')
+
+
+# bound types stored in the transposition table
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+
+class TTEntry(NamedTuple):
+    '''Transposition table entry. move is the best move found, given as
+    source and destination coordinates (x0, y0, x1, y1).'''
+    key: int
+    depth: int
+    bound: int
+    score: int
+    move: Optional[tuple[int, int, int, int]]
+
+
+class TranspositionTable:
+    '''Fixed size hash table of search results keyed by board_hash. The
+    number of entries is worked out from max_bytes up front and never
+    grows. Each bucket has two slots: the first keeps the deepest result
+    seen, the second is always replaced. Counters for probes that hit or
+    miss and for stores that overwrite a different position are kept
+    to help tune the size.
+    Example:
+    >>> tt = TranspositionTable(2**16)
+    >>> tt.store(TTEntry(12345, 3, EXACT, 10, (1, 1, 1, 2)))
+    >>> tt.probe(12345).score, tt.probe(999) is None
+    (10, True)
+    >>> tt.hits, tt.misses
+    (1, 1)
+    '''
+    buckets: int
+    slots: list[Optional[TTEntry]]
+    hits: int
+    misses: int
+    stores: int
+    overwrites: int
+
+    def __init__(self, max_bytes: int):
+        example = TTEntry(2**63, 64, EXACT, MATE_SCORE, (26, 26, 26, 26))
+        entry_bytes = sys.getsizeof(example) \
+            + sum(sys.getsizeof(field) for field in example) \
+            + 8  # pointer from the list of slots
+        self.buckets = max(1, max_bytes // (2 * entry_bytes))
+        self.slots = [None] * (2 * self.buckets)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        i = 2 * (key % self.buckets)
+        for entry in (self.slots[i], self.slots[i + 1]):
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, entry: TTEntry) -> None:
+        i = 2 * (entry.key % self.buckets)
+        deep = self.slots[i]
+        if deep is None or deep.key == entry.key or entry.depth >= deep.depth:
+            slot = i
+        else:
+            slot = i + 1
+        old = self.slots[slot]
+        if old is not None and old.key != entry.key:
+            self.overwrites += 1
+        self.slots[slot] = entry
+        self.stores += 1
+
+    def stats(self) -> dict[str, int]:
+        '''Returns counters, and number of slots filled out of capacity'''
+        return {'hits': self.hits, 'misses': self.misses,
+                'stores': self.stores, 'overwrites': self.overwrites,
+                'filled': sum(e is not None for e in self.slots),
+                'capacity': len(self.slots)}
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    '''Mate scores count plies from the root, but an entry may be found
+    again at a different ply, so store them relative to this node'''
+    if score > MATE_SCORE - 1000:
+        return score + ply
+    if score < -MATE_SCORE + 1000:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    '''Reverses score_to_tt for an entry found at ply'''
+    if score > MATE_SCORE - 1000:
+        return score - ply
+    if score < -MATE_SCORE + 1000:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    '''Raised inside a search when its deadline has passed'''
+
+
+class Searcher:
+    '''Negamax search with alpha-beta pruning over the moves given by
+    get_all_moves. Moves are made and unmade on the board in place, so
+    the board is unchanged once a search returns, even when it runs out
+    of time. Counts nodes visited.
+    If given a transposition table it is used to skip positions already
+    searched deeply enough and to try their best move first.
+    Example:
+    >>> from io import StringIO
+    >>> b = read_board_txt(StringIO("""4
+    ... Ka1, Rb2, Rc1
+    ... Kd4"""))
+    >>> result = Searcher().search(True, b, depth=2)
+    >>> move_to_txt(result.move), result.score == MATE_SCORE - 1
+    ('b2d2', True)
+    '''
+    nodes: int
+    # perf_counter() time at which to give up, None for no limit
+    deadline: Optional[float]
+    # moves currently made on the board, unwound if search times out
+    undo_stack: list[Undo]
+    tt: Optional[TranspositionTable]
+
+    def __init__(self, tt: Optional[TranspositionTable] = None) -> None:
+        self.nodes = 0
+        self.deadline = None
+        self.undo_stack = []
+        self.tt = tt
+
+    def search(self, side: bool, B: Board, depth: int) -> SearchResult:
+        '''Searches depth plies ahead for side and returns the best move'''
+        self.nodes = 0
+        self.deadline = None
+        start = time.perf_counter()
+        score, move = self.search_root(side, B, depth, None)
+        seconds = time.perf_counter() - start
+        return SearchResult(move, score, depth, self.nodes, seconds)
+
+    def search_timed(self, side: bool, B: Board, budget_ms: int,
+                     max_depth: int = 64) -> SearchResult:
+        '''Iterative deepening: searches 1, 2, 3... plies ahead until
+        budget_ms milliseconds have passed or max_depth is done, then
+        returns the best move of the deepest search that completed. An
+        unfinished search is abandoned as soon as the deadline is seen,
+        which is checked at every node. If not even the 1 ply search
+        completes, the first move in search order is returned.'''
+        self.nodes = 0
+        start = time.perf_counter()
+        self.deadline = start + budget_ms / 1000
+        best: tuple[int, Optional[tuple[Piece, int, int]]] = (0, None)
+        completed = 0
+        try:
+            for depth in range(1, max_depth + 1):
+                best = self.search_root(side, B, depth, best[1])
+                completed = depth
+                if best[1] is None or abs(best[0]) >= MATE_SCORE - depth:
+                    # no moves, or forced mate found which cannot improve
+                    break
+        except SearchTimeout:
+            while self.undo_stack:
+                unmake_move(self.undo_stack.pop(), B)
+            if best[1] is None:
+                moves = self.order_moves(get_all_moves(side, B), B)
+                best = (0, moves[0] if moves else None)
+        finally:
+            self.deadline = None
+        seconds = time.perf_counter() - start
+        return SearchResult(best[1], best[0], completed, self.nodes, seconds)
+
+    def search_root(
+            self, side: bool, B: Board, depth: int,
+            first: Optional[tuple[Piece, int, int]]
+    ) -> tuple[int, Optional[tuple[Piece, int, int]]]:
+        '''Like negamax but also returns the move giving the best score.
+        The move first, if given, is searched before the others.'''
+        self.nodes += 1
+        info = king_safety(side, B)
+        moves = self.order_moves(legal_moves(side, B, info), B)
+        if not moves:
+            return (-MATE_SCORE if info.checkers else 0), None
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        alpha = -MATE_SCORE - 1
+        beta = MATE_SCORE + 1
+        best_move = moves[0]
+        for piece, x, y in moves:
+            self.make(piece, x, y, B)
+            score = -self.negamax(not side, B, depth - 1, -beta, -alpha, 1)
+            self.unmake(B)
+            if score > alpha:
+                alpha = score
+                best_move = (piece, x, y)
+        return alpha, best_move
+
+    def negamax(self, side: bool, B: Board, depth: int,
+                alpha: int, beta: int, ply: int) -> int:
+        '''Returns score of B for side, searching depth plies ahead.
+        A mate found ply plies from the root scores MATE_SCORE - ply so
+        that quicker mates are preferred.'''
+        self.nodes += 1
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+        # probe before generating moves so that a hit skips that work.
+        # Positions without moves are never stored, since they return
+        # below before reaching the store. Leaves are not probed, so
+        # they score the same as without a table.
+        key = 0
+        tt_move = None
+        alpha_orig = alpha
+        if self.tt is not None and depth > 0:
+            key = board_hash(side, B)
+            entry = self.tt.probe(key)
+            if entry is not None:
+                if entry.depth >= depth:
+                    score = score_from_tt(entry.score, ply)
+                    if entry.bound == EXACT:
+                        return score
+                    elif entry.bound == LOWER_BOUND:
+                        alpha = max(alpha, score)
+                    else:
+                        beta = min(beta, score)
+                    if alpha >= beta:
+                        return score
+                tt_move = entry.move
+
+        info = king_safety(side, B)
+        moves = legal_moves(side, B, info)
+        if not moves:
+            return -(MATE_SCORE - ply) if info.checkers else 0
+        if depth <= 0:
+            return evaluate(side, B)
+
+        best_score = -MATE_SCORE - 1
+        best_move = None
+        for piece, x, y in self.order_moves(moves, B, tt_move):
+            from_xy = (piece.pos_x, piece.pos_y)
+            self.make(piece, x, y, B)
+            score = -self.negamax(not side, B, depth - 1,
+                                  -beta, -alpha, ply + 1)
+            self.unmake(B)
+            if score > best_score:
+                best_score = score
+                best_move = from_xy + (x, y)
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if self.tt is not None:
+            if best_score <= alpha_orig:
+                bound = UPPER_BOUND
+            elif best_score >= beta:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            self.tt.store(TTEntry(key, depth, bound,
+                                  score_to_tt(best_score, ply), best_move))
+        return best_score
+
+    def make(self, piece: Piece, pos_X: int, pos_Y: int, B: Board) -> None:
+        self.undo_stack.append(make_move(piece, pos_X, pos_Y, B))
+
+    def unmake(self, B: Board) -> None:
+        unmake_move(self.undo_stack.pop(), B)
+
+    @staticmethod
+    def order_moves(
+            moves: list[tuple[Piece, int, int]], B: Board,
+            tt_move: Optional[tuple[int, int, int, int]] = None
+    ) -> list[tuple[Piece, int, int]]:
+        '''Puts the move from the transposition table first, then
+        captures, most valuable victim first, to give more alpha-beta
+        cutoffs. Otherwise keeps the order of get_all_moves.'''
+        def victim_value(move: tuple[Piece, int, int]) -> int:
+            piece, x, y = move
+            if (piece.pos_x, piece.pos_y, x, y) == tt_move:
+                return MATE_SCORE
+            if is_piece_at(x, y, B):
+                return PIECE_VALUES[piece_at(x, y, B).letter] + 1
+            return 0
+        return sorted(moves, key=victim_value, reverse=True)
+
+
+class PerftResult(NamedTuple):
+    '''Leaf count of a perft run with the count below each root move'''
+    nodes: int
+    divide: dict[str, int]
+    seconds: float
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+
+def perft(B: Board, side: bool, depth: int) -> int:
+    '''Counts the positions reached after every sequence of depth legal
+    moves starting with side, for testing and timing move generation.
+    Board B is unchanged afterwards. Example:
+    >>> perft(read_board('board_small_valid.txt'), True, 2)
+    68
+    '''
+    if depth <= 0:
+        return 1
+    moves = get_all_moves(side, B)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for piece, x, y in moves:
+        undo = make_move(piece, x, y, B)
+        nodes += perft(B, not side, depth - 1)
+        unmake_move(undo, B)
+    return nodes
+
+
+def perft_divide(B: Board, side: bool, depth: int) -> PerftResult:
+    '''Runs perft giving the leaf count under each root move as well as
+    the total, and timing. Example:
+    >>> result = perft_divide(read_board('board_small_valid.txt'), True, 2)
+    >>> result.nodes, result.divide['b2c3']
+    (68, 1)
+    '''
+    start = time.perf_counter()
+    divide = {}
+    for piece, x, y in get_all_moves(side, B):
+        move_txt = move_to_txt((piece, x, y))
+        undo = make_move(piece, x, y, B)
+        divide[move_txt] = perft(B, not side, depth - 1)
+        unmake_move(undo, B)
+    seconds = time.perf_counter() - start
+    return PerftResult(sum(divide.values()), divide, seconds)
+
+
+class MateLine(NamedTuple):
+    '''A forced mate found by solve_mate. moves gives the line as text,
+    eg. 'a1b2', starting with the attacking side and alternating, where
+    the defender puts off mate for as long as possible. mate_in is the
+    number of moves of the attacking side, the last one being mate.'''
+    moves: list[str]
+    mate_in: int
+
+    def __str__(self) -> str:
+        return f"mate in {self.mate_in}: {' '.join(self.moves)}"
+
+
+class MateSolver:
+    '''Proves or refutes forced mates by searching only as deep as needed.
+    Moves of the attacking side that give check are tried first, the last
+    move of the attacking side must give check so quiet moves are skipped
+    there, and each node stops at the first move that settles it. Results
+    are remembered by Zobrist key so positions reached by different move
+    orders are not searched again.'''
+    nodes: int
+    # board_hash with attacking side to move -> (largest n proven not to
+    # mate within n moves, smallest n proven to mate within n moves or 0)
+    known: dict[int, tuple[int, int]]
+
+    def __init__(self) -> None:
+        self.nodes = 0
+        self.known = {}
+
+    def attacking_moves(
+            self, side: bool, B: Board, n: int
+    ) -> list[tuple[Piece, int, int]]:
+        '''Legal moves of side with checks first, keeping get_all_moves
+        order otherwise. When n is 1 only checks are returned.'''
+        checks = []
+        quiet = []
+        for piece, x, y in get_all_moves(side, B):
+            undo = make_move(piece, x, y, B)
+            gives_check = is_check(not side, B)
+            unmake_move(undo, B)
+            if gives_check:
+                checks.append((piece, x, y))
+            elif n > 1:
+                quiet.append((piece, x, y))
+        return checks + quiet
+
+    def mates_within(self, side: bool, B: Board, n: int) -> bool:
+        '''Returns true if side, to move, can force mate within n moves'''
+        if n <= 0:
+            return False
+        self.nodes += 1
+        key = board_hash(side, B)
+        refuted, proven = self.known.get(key, (0, 0))
+        if proven and proven <= n:
+            return True
+        if n <= refuted:
+            return False
+        for piece, x, y in self.attacking_moves(side, B, n):
+            undo = make_move(piece, x, y, B)
+            mated = self.is_lost(not side, B, n - 1)
+            unmake_move(undo, B)
+            if mated:
+                self.known[key] = (refuted, n)
+                return True
+        self.known[key] = (n, proven)
+        return False
+
+    def is_lost(self, side: bool, B: Board, n: int) -> bool:
+        '''Returns true if side, to move, is checkmated now or within n
+        moves of the other side whatever it plays'''
+        self.nodes += 1
+        info = king_safety(side, B)
+        if n <= 0:
+            return len(info.checkers) > 0 \
+                and not has_any_legal_move(side, B, info)
+        moves = legal_moves(side, B, info)
+        if not moves:
+            return len(info.checkers) > 0
+        # captures are the likeliest escapes so try them first
+        for piece, x, y in Searcher.order_moves(moves, B):
+            undo = make_move(piece, x, y, B)
+            mated = self.mates_within(not side, B, n)
+            unmake_move(undo, B)
+            if not mated:
+                return False
+        return True
+
+    def shortest_mate(self, side: bool, B: Board, n: int) -> int:
+        '''Returns the fewest moves, up to n, in which side, to move,
+        forces mate, or 0 if it cannot'''
+        for k in range(1, n + 1):
+            if self.mates_within(side, B, k):
+                return k
+        return 0
+
+    def attacking_line(self, side: bool, B: Board, n: int) -> list[str]:
+        '''Line of the quickest mate for side, to move, which is known to
+        force mate within n moves'''
+        k = self.shortest_mate(side, B, n)
+        for piece, x, y in self.attacking_moves(side, B, k):
+            move_txt = move_to_txt((piece, x, y))
+            undo = make_move(piece, x, y, B)
+            mated = self.is_lost(not side, B, k - 1)
+            line = self.defending_line(not side, B, k - 1) if mated else []
+            unmake_move(undo, B)
+            if mated:
+                return [move_txt] + line
+        raise ValueError(f'no mate within {n} moves')
+
+    def defending_line(self, side: bool, B: Board, n: int) -> list[str]:
+        '''Line where side, to move, puts off the mate it cannot escape
+        within n moves for as long as possible'''
+        best_k = 0
+        best_move = None
+        for piece, x, y in get_all_moves(side, B):
+            undo = make_move(piece, x, y, B)
+            k = self.shortest_mate(not side, B, n)
+            unmake_move(undo, B)
+            if k > best_k:
+                best_k = k
+                best_move = (piece, x, y)
+        if best_move is None:
+            return []
+        piece, x, y = best_move
+        move_txt = move_to_txt(best_move)
+        undo = make_move(piece, x, y, B)
+        line = self.attacking_line(not side, B, best_k)
+        unmake_move(undo, B)
+        return [move_txt] + line
+
+    def solve(self, side: bool, B: Board, n: int) -> list[MateLine]:
+        '''Returns a line for every first move of side that forces mate
+        within n moves, quickest mates first. Board B is unchanged.
+        Raises ValueError if the other side is already in check, since
+        side could then take the king.'''
+        if is_check(not side, B):
+            raise ValueError('side not to move is in check')
+        lines = []
+        for piece, x, y in self.attacking_moves(side, B, n):
+            move_txt = move_to_txt((piece, x, y))
+            undo = make_move(piece, x, y, B)
+            for k in range(1, n + 1):
+                if self.is_lost(not side, B, k - 1):
+                    line = self.defending_line(not side, B, k - 1)
+                    lines.append(MateLine([move_txt] + line, k))
+                    break
+            unmake_move(undo, B)
+        return sorted(lines, key=lambda line: line.mate_in)
+
+
+def solve_mate(B: Board, side: bool, n: int) -> list[MateLine]:
+    '''Finds every move of side that forces checkmate within n moves of
+    side, each with the line that follows when the defender resists for
+    longest. An empty list proves there is no mate within n moves.
+    Example:
+    >>> from io import StringIO
+    >>> b = read_board_txt(StringIO("""4
+    ... Ka1, Rb2, Rc1
+    ... Kd4"""))
+    >>> for line in solve_mate(b, True, 1):
+    ...     print(line)
+    mate in 1: b2d2
+    '''
+    return MateSolver().solve(side, B, n)
 
 
 def find_black_move(B: Board) -> tuple[Piece, int, int]:
@@ -682,9 +1860,29 @@ def find_black_move(B: Board) -> tuple[Piece, int, int]:
     Hints:
     - use methods of random library
     - use can_move_to
+
+    Plays the move from the endgame tables in TABLEBASE_DIR if they cover
+    the position. Otherwise searches for up to SEARCH_BUDGET_MS
+    milliseconds if set, else SEARCH_DEPTH plies ahead, or picks a
+    random move if SEARCH_DEPTH is 0.
     '''
-    all_moves = get_all_moves(False, B)
-    return random.choice(all_moves)
+    if TABLEBASE_DIR is not None:
+        from tablebase import get_tablebase_set
+        move_txt = get_tablebase_set(TABLEBASE_DIR).best_move(False, B)
+        if move_txt is not None:
+            move = parse_move(move_txt, False, B)
+            if move is not None:
+                return move
+    if SEARCH_DEPTH <= 0 and SEARCH_BUDGET_MS is None:
+        all_moves = get_all_moves(False, B)
+        return random.choice(all_moves)
+    searcher = Searcher(TranspositionTable(TT_MEMORY_BYTES))
+    if SEARCH_BUDGET_MS is not None:
+        result = searcher.search_timed(False, B, SEARCH_BUDGET_MS)
+    else:
+        result = searcher.search(False, B, SEARCH_DEPTH)
+    assert result.move is not None
+    return result.move
 
 
 def conf2unicode(B: Board) -> str:
@@ -744,6 +1942,12 @@ def parse_move(
     if not (Piece.is_inbounds(x0, y0, B) and Piece.is_inbounds(x1, y1, B)):
         return None
 
+    # with a PieceList the move is looked up in the saved set of legal
+    # moves, written the same way, eg. 'a01b2' as 'a1b2'
+    if isinstance(B[1], PieceList):
+        move_txt = index2location(x0, y0) + index2location(x1, y1)
+        return legal_move_set(side, B).get(move_txt)
+
     # check if piece exists
     if not is_piece_at(x0, y0, B):
         return None
@@ -775,6 +1979,23 @@ def move_to_txt(move: tuple[Piece, int, int]) -> str:
     return source + dest
 
 
+def move_completer(
+        words: Iterable[str]) -> Callable[[str, int], Optional[str]]:
+    '''Returns a readline completer offering the words that start with the
+    text typed so far, in sorted order.
+    Example:
+    >>> complete = move_completer(['a1b2', 'a1c3', 'b2b3'])
+    >>> complete('a1', 0), complete('a1', 1), complete('a1', 2)
+    ('a1b2', 'a1c3', None)
+    '''
+    choices = sorted(words)
+
+    def complete(text: str, state: int) -> Optional[str]:
+        matches = [word for word in choices if word.startswith(text)]
+        return matches[state] if state < len(matches) else None
+    return complete
+
+
 def prompt_move(side: bool, B: Board) -> Optional[tuple[Piece, int, int]]:
     '''Prompts user for move, keeps asking until a valid move is given
     or the user typed 'QUIT'.
@@ -785,14 +2006,23 @@ def prompt_move(side: bool, B: Board) -> Optional[tuple[Piece, int, int]]:
     err_msg = ''
     color = 'White' if side else 'Black'
     prompt_msg = f'Next move of {color}:\n'
-    while True:
-        user_input = input(err_msg + prompt_msg)
-        if user_input == CMD_QUIT:
-            return None
-        move_info = parse_move(user_input, side, B)
-        if move_info is not None:
-            break
-        err_msg = '\nThis is not a valid move. '
+    # tab: autocompletion of the legal moves
+    old_completer = readline.get_completer()
+    readline.set_completer(
+        move_completer(list(legal_move_set(side, B)) + [CMD_QUIT]))
+    readline.parse_and_bind('tab: complete')
+    try:
+        while True:
+            user_input = input(err_msg + prompt_msg)
+            if user_input == CMD_QUIT:
+                return None
+            move_info = parse_move(user_input, side, B)
+            if move_info is not None:
+                break
+            err_msg = '\nThis is not a valid move. '
+    finally:
+        readline.parse_and_bind('tab: ""')
+        readline.set_completer(old_completer)
     return move_info
 
 
@@ -838,22 +2068,221 @@ def prompt_file() -> Optional[Board]:
     return board
 
 
+def game_status(side: bool, B: Board) -> Optional[str]:
+    '''Returns CHECKMATE if side is in checkmate, NO_MOVES if side is not
+    in check but has no possible moves, or None if side can play on.'''
+    info = king_safety(side, B)
+    if has_any_legal_move(side, B, info):
+        return None
+    return CHECKMATE if info.checkers else NO_MOVES
+
+
 def check_for_termination(cur_side: bool, B: Board) -> bool:
     '''Checks whether game has finished or not.
     Returns true if side is either in checkmate or has no possible moves.
     Also prints an appropriate message to console.
     '''
     name = {True: 'White', False: 'Black'}
-    if is_checkmate(cur_side, B):
+    status = game_status(cur_side, B)
+    if status == CHECKMATE:
         cur_side = not cur_side
         print(f'Game over. {name[cur_side]} wins.')
         return True
-    elif len(get_all_moves(cur_side, B)) == 0:
+    elif status == NO_MOVES:
         print(f'{name[cur_side]} has no moves. Game over.')
         return True
     return False
 
 
+# picks the move for side on board B, or returns None to stop the game
+# as if the player typed QUIT
+Policy = Callable[[bool, Board], Optional[tuple[Piece, int, int]]]
+
+
+class GameResult(NamedTuple):
+    '''Outcome of play_game. reason is CHECKMATE, NO_MOVES, QUIT or
+    MAX_PLIES. winner is the side that gave checkmate, None otherwise.
+    moves lists the moves played as text, eg. 'a1b2', starting with
+    White's, and board is the final board.'''
+    reason: str
+    winner: Optional[bool]
+    moves: list[str]
+    board: Board
+
+    @property
+    def plies(self) -> int:
+        return len(self.moves)
+
+
+def play_game(B: Board, white_policy: Policy, black_policy: Policy,
+              max_plies: int = 1000) -> GameResult:
+    '''Plays a game on B by the same rules as main but without any input
+    or output, White moving first. The game stops at checkmate, when the
+    side to move has no moves, when a policy returns None, or after
+    max_plies moves. B is updated in place.
+    Raises ValueError if a policy returns a move that is not valid.
+    Example:
+    >>> b = read_board('board_small_valid.txt')
+    >>> result = play_game(b, random_policy(1), random_policy(101), 40)
+    >>> result.reason, result.winner, result.moves
+    ('checkmate', True, ['a1d1', 'b3d1', 'b2a1', 'a4b4', 'a1c3'])
+    '''
+    moves: list[str] = []
+    side = True
+    while True:
+        status = game_status(side, B)
+        if status is not None:
+            winner = (not side) if status == CHECKMATE else None
+            return GameResult(status, winner, moves, B)
+        if len(moves) >= max_plies:
+            return GameResult(MAX_PLIES, None, moves, B)
+        move = (white_policy if side else black_policy)(side, B)
+        if move is None:
+            return GameResult(QUIT, None, moves, B)
+        piece, x, y = move
+        if piece.side != side or not piece.can_move_to(x, y, B):
+            raise ValueError(f'{move_to_txt(move)} is not a valid move')
+        moves.append(move_to_txt(move))
+        piece.move_to(x, y, B)
+        side = not side
+
+
+def random_policy(seed: Optional[int] = None) -> Policy:
+    '''Policy playing a random valid move, seeded so games repeat'''
+    rng = random.Random(seed)
+
+    def policy(side: bool, B: Board) -> Optional[tuple[Piece, int, int]]:
+        return rng.choice(get_all_moves(side, B))
+    return policy
+
+
+def search_policy(depth: int) -> Policy:
+    '''Policy playing the best move found searching depth plies ahead'''
+    def policy(side: bool, B: Board) -> Optional[tuple[Piece, int, int]]:
+        searcher = Searcher(TranspositionTable(TT_MEMORY_BYTES))
+        return searcher.search(side, B, depth).move
+    return policy
+
+
+class Instrumentation:
+    '''Counts and times calls to the instrumented functions and methods
+    for each turn of a game. install replaces them with counting wrappers
+    and uninstall puts the originals back, so while it is not installed
+    they run exactly as normal with no added cost.
+    Times include calls made from inside, eg. king_safety includes the
+    is_piece_at calls it makes. A function calling itself, like negamax,
+    has its time counted once, for the outermost call.
+    Example:
+    >>> stats = Instrumentation()
+    >>> stats.install()
+    >>> b = read_board('board_examp.txt')
+    >>> piece_at(3, 5, b).can_move_to(4, 5, b)  # Kc5 to d5 is attacked
+    False
+    >>> stats.end_turn()
+    >>> stats.uninstall()
+    >>> stats.turns[0]['can_move_to'], stats.turns[0]['is_check']
+    (1, 1)
+    '''
+    # calls and nanoseconds of each function in each finished turn
+    turns: list[dict[str, int]]
+    turn_ns: list[dict[str, int]]
+    # calls and nanoseconds so far in the current turn
+    calls: dict[str, int]
+    total_ns: dict[str, int]
+    originals: list[tuple[Any, str, Callable[..., Any]]]
+
+    def __init__(self) -> None:
+        names = INSTRUMENTED_FUNCTIONS + INSTRUMENTED_METHODS
+        self.turns = []
+        self.turn_ns = []
+        self.calls = dict.fromkeys(names, 0)
+        self.total_ns = dict.fromkeys(names, 0)
+        self.originals = []
+
+    def wrap(self, name: str,
+             function: Callable[..., Any]) -> Callable[..., Any]:
+        calls = self.calls
+        total_ns = self.total_ns
+        # whether a call of function is running, so recursive calls are
+        # not timed twice
+        active = [False]
+
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            calls[name] += 1
+            if active[0]:
+                return function(*args, **kwargs)
+            active[0] = True
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                total_ns[name] += time.perf_counter_ns() - start
+                active[0] = False
+        return wrapper
+
+    def install(self) -> None:
+        module = sys.modules[__name__]
+        targets: list[tuple[Any, str]] = [
+            (module, name) for name in INSTRUMENTED_FUNCTIONS]
+        targets += [(cls, name)
+                    for cls in (Piece, Rook, Bishop, King, Searcher)
+                    for name in INSTRUMENTED_METHODS if name in vars(cls)]
+        for owner, name in targets:
+            original = getattr(owner, name)
+            self.originals.append((owner, name, original))
+            setattr(owner, name, self.wrap(name, original))
+
+    def uninstall(self) -> None:
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def end_turn(self) -> None:
+        '''Records the calls and time since the last turn ended'''
+        self.turns.append(dict(self.calls))
+        self.turn_ns.append(dict(self.total_ns))
+        for name in self.calls:
+            self.calls[name] = 0
+            self.total_ns[name] = 0
+
+    def summary(self) -> str:
+        '''Table of calls to each function in total, per turn on average
+        and in the busiest turn, with total time, time in the slowest turn
+        and average time per call'''
+        if any(self.calls.values()):
+            self.end_turn()
+        turns = len(self.turns)
+        lines = [f'Instrumentation over {turns} turns:',
+                 f"{'function':<16}{'calls':>10}{'per turn':>10}"
+                 f"{'max':>8}{'total ms':>11}{'max ms':>9}{'us/call':>9}"]
+        for name in self.calls:
+            counts = [turn[name] for turn in self.turns]
+            times = [turn[name] for turn in self.turn_ns]
+            calls = sum(counts)
+            lines.append(
+                f'{name:<16}{calls:>10}{calls / max(turns, 1):>10.1f}'
+                f'{max(counts, default=0):>8}'
+                f'{sum(times) / 1e6:>11.1f}'
+                f'{max(times, default=0) / 1e6:>9.1f}'
+                f'{sum(times) / 1e3 / max(calls, 1):>9.2f}')
+        return '\n'.join(lines)
+
+
+# set to an installed Instrumentation to count calls while playing
+INSTRUMENTATION: Optional[Instrumentation] = None
+
+
+def end_instrumented_turn() -> None:
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.end_turn()
+
+
+def print_instrumentation() -> None:
+    if INSTRUMENTATION is not None:
+        print(INSTRUMENTATION.summary())
+
+
 def main() -> None:
     '''
     Runs the play, using a text input prompt
@@ -893,6 +2322,7 @@ def main() -> None:
     cur_side = True
     while True:
         if check_for_termination(cur_side, board):
+            print_instrumentation()
             return
 
         # user makes move
@@ -901,9 +2331,11 @@ def main() -> None:
             # user typed 'QUIT'
             prompt_save(board)
             print('The game configuration saved.')
+            print_instrumentation()
             return
         piece, x, y = move_info
         board = piece.move_to(x, y, board)
+        end_instrumented_turn()
 
         # display board
         print(f"The configuration after {name[cur_side]}'s move is:")
@@ -913,12 +2345,14 @@ def main() -> None:
         cur_side = not cur_side
         if PLAY_AGAINST_COMPUTER:
             if check_for_termination(cur_side, board):
+                print_instrumentation()
                 return
 
             # computer makes move
             piece, x, y = find_black_move(board)
             mov_txt = move_to_txt((piece, x, y))
             board = piece.move_to(x, y, board)
+            end_instrumented_turn()
 
             # display board
             print(f"Next move of Black is {mov_txt}. The configuration "
@@ -927,9 +2361,134 @@ def main() -> None:
             cur_side = not cur_side
 
 
+def run_analyse(filename: str, workers: Optional[int] = None) -> None:
+    '''Searches the board in filename for each side, printing the best
+    move, node counts and transposition table statistics. If workers is
+    given, the root moves are shared out over that many processes.'''
+    board = read_board(filename)
+    for side in (True, False):
+        name = 'White' if side else 'Black'
+        if workers is not None:
+            from parallel import parallel_search
+            result = parallel_search(board, side, max(SEARCH_DEPTH, 1),
+                                     workers)
+            print(f'{name}: {result}')
+            continue
+        tt = TranspositionTable(TT_MEMORY_BYTES)
+        searcher = Searcher(tt)
+        if SEARCH_BUDGET_MS is not None:
+            result = searcher.search_timed(side, board, SEARCH_BUDGET_MS)
+        else:
+            result = searcher.search(side, board, max(SEARCH_DEPTH, 1))
+        print(f'{name}: {result}')
+        print(f'{name} transposition table: {tt.stats()}')
+
+
+def run_mate(filename: str, n: int, side: bool) -> None:
+    '''Prints every forced mate within n moves for side on the board in
+    filename, or that there is none, with node count and time taken.'''
+    board = read_board(filename)
+    solver = MateSolver()
+    start = time.perf_counter()
+    lines = solver.solve(side, board, n)
+    seconds = time.perf_counter() - start
+    name = 'White' if side else 'Black'
+    for line in lines:
+        print(line)
+    if not lines:
+        print(f'{name} has no forced mate within {n} moves')
+    print(f'\nNodes: {solver.nodes}')
+    print(f'Time: {seconds:.3f}s')
+
+
+def run_validate(filename: str) -> None:
+    '''Reads every board in filename, printing the error for each invalid
+    one and then the number of valid and invalid boards.'''
+    valid = 0
+    invalid = 0
+    for record in read_boards(filename):
+        if record.error is None:
+            valid += 1
+        else:
+            invalid += 1
+            print(record.error)
+    print(f'Valid: {valid}')
+    print(f'Invalid: {invalid}')
+
+
+def run_perft(filename: str, depth: int, side: bool,
+              workers: Optional[int] = None) -> None:
+    '''Prints perft divide of the board in filename then the total leaf
+    count and nodes per second. If workers is given, the root moves are
+    shared out over that many processes.'''
+    board = read_board(filename)
+    if workers is not None:
+        from parallel import parallel_perft
+        result = parallel_perft(board, side, depth, workers)
+    else:
+        result = perft_divide(board, side, depth)
+    for move_txt, nodes in result.divide.items():
+        print(f'{move_txt}: {nodes}')
+    print(f'\nMoves: {len(result.divide)}')
+    print(f'Nodes: {result.nodes}')
+    print(f'Time: {result.seconds:.3f}s')
+    print(f'Nodes/sec: {result.nodes_per_second:.0f}')
+
+
 if __name__ == '__main__':  # keep this in
     parser = argparse.ArgumentParser()
     parser.add_argument('--playself', action='store_true',
                         help='Play against yourself')
-    PLAY_AGAINST_COMPUTER = not parser.parse_args().playself
-    main()
+    parser.add_argument('--depth', type=int, default=SEARCH_DEPTH,
+                        help='Plies the computer searches, 0 for random')
+    parser.add_argument('--budget', type=int, metavar='MS',
+                        help='Milliseconds the computer may search for '
+                        + 'each move, overrides --depth')
+    parser.add_argument('--tablebase', metavar='DIR',
+                        help='Directory of endgame tables for the computer '
+                        + 'to play perfectly from')
+    parser.add_argument('--analyse', metavar='FILE',
+                        help='Search board in FILE for both sides, print '
+                        + 'best moves with node counts and exit')
+    parser.add_argument('--perft', nargs=2, metavar=('FILE', 'DEPTH'),
+                        help='Count move tree leaves of board in FILE to '
+                        + 'DEPTH plies, print per move counts and exit')
+    parser.add_argument('--mate', nargs=2, metavar=('FILE', 'N'),
+                        help='List every forced mate within N moves in '
+                        + 'board in FILE and exit')
+    parser.add_argument('--validate', metavar='FILE',
+                        help='Check every board in FILE, which holds '
+                        + 'boards one after another or, if it ends '
+                        + '.jsonl, one JSON string per line, and exit')
+    parser.add_argument('--black', action='store_true',
+                        help='Black moves first in --perft or --mate')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='Run --perft or --analyse (fixed depth) on N '
+                        + 'processes')
+    parser.add_argument('--instrument', action='store_true',
+                        help='Count and time calls to the rule functions '
+                        + 'each turn and print a summary when the game '
+                        + f'ends, also turned on by {INSTRUMENT_ENV}=1')
+    args = parser.parse_args()
+    PLAY_AGAINST_COMPUTER = not args.playself
+    SEARCH_DEPTH = args.depth
+    SEARCH_BUDGET_MS = args.budget
+    TABLEBASE_DIR = args.tablebase
+    if args.analyse is not None:
+        run_analyse(args.analyse, args.workers)
+    elif args.validate is not None:
+        run_validate(args.validate)
+    elif args.mate is not None:
+        if not args.mate[1].isdigit() or int(args.mate[1]) < 1:
+            parser.error('--mate N must be a positive whole number of moves')
+        run_mate(args.mate[0], int(args.mate[1]), not args.black)
+    elif args.perft is not None:
+        if not args.perft[1].isdigit():
+            parser.error('--perft DEPTH must be a whole number of plies')
+        run_perft(args.perft[0], int(args.perft[1]), not args.black,
+                  args.workers)
+    else:
+        if args.instrument or os.environ.get(INSTRUMENT_ENV) == '1':
+            INSTRUMENTATION = Instrumentation()
+            INSTRUMENTATION.install()
+        main()
@@ -0,0 +1,201 @@
+import argparse
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator
+
+from chess_puzzle import \
+    Board, Bishop, King, Rook, PieceList, FILEPATH, MSG_IOERROR, \
+    board_to_txt, read_boards
+
+# A board is encoded as one byte for the size followed by 3 bytes per
+# piece: a byte for its type and side, then its square numbered
+# (y - 1) * size + (x - 1) as 2 bytes big endian, since a 26x26 board has
+# more than 256 squares. Pieces keep their order on the board.
+PIECE_FORMAT = struct.Struct('>BH')
+# type and side byte is 2 * index in LETTERS, plus 1 for White
+LETTERS = 'KRB'
+# constructor and side for each type and side byte
+PIECE_TYPES = ((King, False), (King, True), (Rook, False), (Rook, True),
+               (Bishop, False), (Bishop, True))
+
+# A corpus file is MAGIC and VERSION, the encoded boards one after
+# another, an index giving the offset of each board and then the offset
+# of the end of the last board, and lastly the number of boards. The
+# index is at the end so boards can be written as they are read.
+MAGIC = b'CPBC'
+VERSION = 1
+HEADER_LEN = len(MAGIC) + 1
+OFFSET_FORMAT = struct.Struct('>Q')
+
+
+def encode_board(B: Board) -> bytes:
+    '''Converts board B to the binary format.
+    Example:
+    >>> encode_board((4, [King(2, 2, True), King(2, 4, False)])).hex(' ')
+    '04 01 00 05 00 00 0d'
+    '''
+    size = B[0]
+    data = bytearray([size])
+    for piece in B[1]:
+        code = 2 * LETTERS.index(piece.letter) + (1 if piece.side else 0)
+        square = (piece.pos_y - 1) * size + piece.pos_x - 1
+        data += PIECE_FORMAT.pack(code, square)
+    return bytes(data)
+
+
+def decode_board(data: bytes) -> Board:
+    '''Converts binary format back to a board. Raises IOError if data does
+    not give a valid board, checked the same way as read_board_txt.
+    Example:
+    >>> decode_board(bytes.fromhex('04 01 00 05 00 00 0d'))
+    (4, [King(2, 2, white), King(2, 4, black)])
+    '''
+    if len(data) < 1 or (len(data) - 1) % PIECE_FORMAT.size != 0:
+        raise IOError(f'board {MSG_IOERROR}')
+    size = data[0]
+    if size < 2 or size > 26:
+        raise IOError(f'board {MSG_IOERROR}')
+    pieces = PieceList()
+    squares = set()
+    counts = [0] * len(PIECE_TYPES)
+    for code, square in PIECE_FORMAT.iter_unpack(data[1:]):
+        if code >= len(PIECE_TYPES) or square >= size * size \
+                or square in squares:
+            raise IOError(f'board {MSG_IOERROR}')
+        squares.add(square)
+        counts[code] += 1
+        constructor, side = PIECE_TYPES[code]
+        y, x = divmod(square, size)
+        pieces.append(constructor(x + 1, y + 1, side))
+    # codes 0 and 1 are the black and white kings
+    if counts[0] != 1 or counts[1] != 1:
+        raise IOError(f'board {MSG_IOERROR}')
+    return size, pieces
+
+
+def write_corpus(path: str, boards: Iterable[Board]) -> int:
+    '''Writes boards to a corpus file at path, one at a time, and returns
+    how many were written'''
+    offsets = []
+    with open(path, 'wb') as f:
+        f.write(MAGIC + bytes([VERSION]))
+        offset = HEADER_LEN
+        for board in boards:
+            offsets.append(offset)
+            data = encode_board(board)
+            f.write(data)
+            offset += len(data)
+        offsets.append(offset)
+        for offset in offsets:
+            f.write(OFFSET_FORMAT.pack(offset))
+        f.write(OFFSET_FORMAT.pack(len(offsets) - 1))
+    return len(offsets) - 1
+
+
+class Corpus:
+    '''A corpus file opened through mmap, so board n is decoded on demand
+    from its offset in the index without reading the rest of the file.
+    Example:
+    >>> import os, tempfile
+    >>> from chess_puzzle import read_board
+    >>> path = os.path.join(tempfile.mkdtemp(), 'boards.cpbc')
+    >>> write_corpus(path, [read_board('board_examp.txt'),
+    ...                     read_board('board_small_valid.txt')])
+    2
+    >>> with Corpus(path) as corpus:
+    ...     len(corpus), corpus[1] == read_board('board_small_valid.txt')
+    (2, True)
+    '''
+    data: mmap.mmap
+    count: int
+    index_offset: int
+
+    def __init__(self, path: str):
+        # an empty file cannot be mapped, so check the size first
+        if os.path.getsize(path) < HEADER_LEN + 2 * OFFSET_FORMAT.size:
+            raise IOError(f"'{path}' is not a corpus file")
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self.data)
+        if self.data[:4] != MAGIC or self.data[4] != VERSION:
+            raise IOError(f"'{path}' is not a corpus file")
+        self.count = OFFSET_FORMAT.unpack_from(
+            self.data, size - OFFSET_FORMAT.size)[0]
+        self.index_offset = size - (self.count + 2) * OFFSET_FORMAT.size
+        # the last offset is where the index starts, so a cut short file
+        # is caught here rather than when its boards are decoded
+        if self.index_offset < HEADER_LEN \
+                or self.offset(self.count) != self.index_offset:
+            raise IOError(f"'{path}' is not a corpus file")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def offset(self, n: int) -> int:
+        return OFFSET_FORMAT.unpack_from(
+            self.data, self.index_offset + n * OFFSET_FORMAT.size)[0]
+
+    def __getitem__(self, n: int) -> Board:
+        '''Decodes board n, counting from 0'''
+        if n < 0:
+            n += self.count
+        if not 0 <= n < self.count:
+            raise IndexError('corpus index out of range')
+        return decode_board(self.data[self.offset(n):self.offset(n + 1)])
+
+    def __iter__(self) -> Iterator[Board]:
+        for n in range(self.count):
+            yield self[n]
+
+    def close(self) -> None:
+        self.data.close()
+
+    def __enter__(self) -> 'Corpus':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def text_to_corpus(txt_filename: str, path: str) -> int:
+    '''Writes every board in txt_filename, read with read_boards, to a
+    corpus file at path and returns how many were written. Raises the
+    IOError of the first invalid board.'''
+    def boards() -> Iterator[Board]:
+        for record in read_boards(txt_filename):
+            if record.error is not None:
+                raise record.error
+            assert record.board is not None
+            yield record.board
+    return write_corpus(path, boards())
+
+
+def corpus_to_text(path: str, txt_filename: str) -> int:
+    '''Writes every board in the corpus file at path to txt_filename in
+    current directory in plain format, with a blank line between boards,
+    and returns how many were written. As with save_board the file must
+    not already exist.'''
+    count = 0
+    with Corpus(path) as corpus, open(FILEPATH + txt_filename, 'x') as f:
+        for board in corpus:
+            if count:
+                f.write('\n')
+            f.write(board_to_txt(board))
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Convert between plain format boards and corpus files')
+    parser.add_argument('command', choices=['pack', 'unpack'],
+                        help='pack text into a corpus or unpack a corpus '
+                        + 'into text')
+    parser.add_argument('source', help='file to read')
+    parser.add_argument('dest', help='file to write')
+    args = parser.parse_args()
+    if args.command == 'pack':
+        print(f'{text_to_corpus(args.source, args.dest)} boards packed')
+    else:
+        print(f'{corpus_to_text(args.source, args.dest)} boards unpacked')
@@ -0,0 +1,107 @@
+import time
+from io import StringIO
+from multiprocessing import Pool
+from typing import Optional
+
+from chess_puzzle import \
+    Board, MATE_SCORE, PerftResult, Searcher, SearchResult, \
+    TranspositionTable, TT_MEMORY_BYTES, board_to_txt, get_all_moves, \
+    make_move, move_to_txt, parse_move, perft, piece_at, read_board_txt
+
+# a root move handed to a worker: board in plain text format, side to
+# move, the move as text eg. 'a1b2', and depth still to go after it
+Task = tuple[str, bool, str, int]
+
+
+def play_root_move(task: Task) -> tuple[Board, bool, int]:
+    '''Rebuilds the board from its text and plays the root move on it.
+    Returns the board, the side now to move and the remaining depth.'''
+    board_txt, side, move_txt, depth = task
+    board = read_board_txt(StringIO(board_txt))
+    move = parse_move(move_txt, side, board)
+    assert move is not None, f'{move_txt} is not a legal move'
+    piece, x, y = move
+    make_move(piece, x, y, board)
+    return board, not side, depth
+
+
+def perft_worker(task: Task) -> int:
+    board, side, depth = play_root_move(task)
+    return perft(board, side, depth)
+
+
+def search_worker(task: Task) -> tuple[int, int]:
+    '''Returns score of the root move for the side that played it, and
+    the number of nodes searched'''
+    board, side, depth = play_root_move(task)
+    searcher = Searcher(TranspositionTable(TT_MEMORY_BYTES))
+    # position after the root move is 1 ply from the root
+    score = searcher.negamax(side, board, depth, -MATE_SCORE - 1,
+                             MATE_SCORE + 1, 1)
+    return -score, searcher.nodes
+
+
+def make_tasks(B: Board, side: bool, depth: int) -> list[Task]:
+    '''One task per legal move of side, in get_all_moves order. The board
+    is sent as text, which is much cheaper to pickle than Piece objects.'''
+    board_txt = board_to_txt(B)
+    # moves are found on a board rebuilt from the text, because B may
+    # come from chess_puzzle run as a script, whose classes are not the
+    # ones imported here
+    board = read_board_txt(StringIO(board_txt))
+    return [(board_txt, side, move_to_txt(move), depth - 1)
+            for move in get_all_moves(side, board)]
+
+
+def parallel_perft(B: Board, side: bool, depth: int,
+                   workers: Optional[int] = None) -> PerftResult:
+    '''Same as perft_divide in chess_puzzle, but the root moves are shared
+    out over a pool of worker processes (default one per CPU). The
+    divide is listed in root move order however the work is scheduled.
+    Example:
+    >>> from chess_puzzle import read_board
+    >>> parallel_perft(read_board('board_examp.txt'), True, 3, 2).nodes
+    1456
+    '''
+    start = time.perf_counter()
+    tasks = make_tasks(B, side, depth)
+    with Pool(workers) as pool:
+        counts = pool.map(perft_worker, tasks, chunksize=1)
+    divide = {task[2]: nodes for task, nodes in zip(tasks, counts)}
+    seconds = time.perf_counter() - start
+    return PerftResult(sum(counts), divide, seconds)
+
+
+def parallel_search(B: Board, side: bool, depth: int,
+                    workers: Optional[int] = None) -> SearchResult:
+    '''Searches depth plies ahead for side with each root move searched
+    by its own worker with a full window. Gives the same score as
+    Searcher.search; if several moves share the best score the first in
+    get_all_moves order is chosen, so the result does not depend on
+    which worker finishes first.
+    Example:
+    >>> from chess_puzzle import read_board
+    >>> result = parallel_search(read_board('board_examp.txt'), True, 2)
+    >>> move_to_txt(result.move), result.score
+    ('a5a3', 99999)
+    '''
+    start = time.perf_counter()
+    tasks = make_tasks(B, side, depth)
+    if not tasks:
+        # no move to hand out, so search a rebuilt board as in make_tasks
+        # for the mate or stalemate score; the move is None either way
+        board = read_board_txt(StringIO(board_to_txt(B)))
+        return Searcher().search(side, board, depth)
+    with Pool(workers) as pool:
+        results = pool.map(search_worker, tasks, chunksize=1)
+    best = max(range(len(tasks)), key=lambda i: (results[i][0], -i))
+    nodes = 1 + sum(n for _, n in results)
+    # the move is found on a board rebuilt from text, as in make_tasks,
+    # and then its piece is looked up on B
+    board = read_board_txt(StringIO(tasks[best][0]))
+    parsed = parse_move(tasks[best][2], side, board)
+    assert parsed is not None
+    piece, x, y = parsed
+    move = (piece_at(piece.pos_x, piece.pos_y, B), x, y)
+    seconds = time.perf_counter() - start
+    return SearchResult(move, results[best][0], depth, nodes, seconds)
@@ -1,8 +1,10 @@
+import json
 import random
 import chess_puzzle
 import queue
 from multiprocessing import Process, Queue, Lock
 from chess_puzzle import index2location
+from tournament import run_tournament
 
 
 class PatchIO:
@@ -86,15 +88,15 @@ def run_process_patch_inputs(board_filename: str,
 
 
 if __name__ == '__main__':
+    # the boards and seeds this script used to play one process at a
+    # time, now played headless across every core by tournament.py;
+    # run_process_patch_inputs is kept for driving main through its
+    # prompts
     seed = 228
-    chess_puzzle.RANDOM_SEED = seed
-    run_process_patch_inputs('board_large_fair.txt', 12, seed)
-    run_process_patch_inputs('board_large_white_adv.txt', 12, seed)
-    for _ in range(5):
-        seed += 1
-        chess_puzzle.RANDOM_SEED = seed
-        run_process_patch_inputs('board_examp.txt', 5, seed)
-    for _ in range(5):
-        seed += 1
-        chess_puzzle.RANDOM_SEED = seed
-        run_process_patch_inputs('board_small_valid.txt', 4, seed)
+    stats = run_tournament(['board_large_fair.txt',
+                            'board_large_white_adv.txt'], 1,
+                           'random', 'search:2', seed=seed)
+    print(json.dumps(stats, indent=2))
+    stats = run_tournament(['board_examp.txt', 'board_small_valid.txt'], 5,
+                           'random', 'search:2', seed=seed + 1)
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,361 @@
+import argparse
+import mmap
+import os
+from functools import lru_cache
+from io import StringIO
+from typing import Optional
+
+from chess_puzzle import \
+    Board, Bishop, King, Rook, PieceList, board_to_txt, \
+    get_all_moves, is_check, is_piece_at, make_move, move_to_txt, \
+    read_board_txt, unmake_move
+
+# Each position has one byte: 0 is a draw, 1 to 126 a win for the side to
+# move in that many plies, LOSS + n a loss in n plies (LOSS itself is
+# checkmate) and ILLEGAL for squares that coincide or the side not to
+# move being in check.
+DRAW = 0
+LOSS = 128
+ILLEGAL = 255
+MAX_PLIES = 126
+MAGIC = b'CPTB'
+VERSION = 1
+# canonical order of piece letters within each side
+LETTER_ORDER = 'KRB'
+CONSTRUCTORS = {'K': King, 'R': Rook, 'B': Bishop}
+
+# pieces of a table: (letter, side) for White's pieces then Black's
+Signature = tuple[tuple[str, bool], ...]
+
+
+def canonical(letters: str) -> str:
+    '''Sorts piece letters into canonical order, King first.
+    >>> canonical('BRK')
+    'KRB'
+    '''
+    return ''.join(sorted(letters, key=LETTER_ORDER.index))
+
+
+def make_signature(white: str, black: str) -> Signature:
+    return tuple([(letter, True) for letter in canonical(white)]
+                 + [(letter, False) for letter in canonical(black)])
+
+
+def board_signature(B: Board) -> Signature:
+    white = ''.join(p.letter for p in B[1] if p.side)
+    black = ''.join(p.letter for p in B[1] if not p.side)
+    return make_signature(white, black)
+
+
+def table_filename(size: int, signature: Signature) -> str:
+    '''For example 5x5_KRvK.cptb'''
+    white = ''.join(letter for letter, side in signature if side)
+    black = ''.join(letter for letter, side in signature if not side)
+    return f'{size}x{size}_{white}v{black}.cptb'
+
+
+def position_index(size: int, signature: Signature, side: bool,
+                   B: Board) -> int:
+    '''Index of board B with side to move in the table for signature.
+    Squares are numbered (y - 1) * size + (x - 1) and the index is the
+    squares of the pieces, in signature order, as digits base size * size,
+    times 2 plus 1 if Black is to move.'''
+    remaining = list(B[1])
+    index = 0
+    for letter, piece_side in signature:
+        for i, piece in enumerate(remaining):
+            if piece.letter == letter and piece.side == piece_side:
+                break
+        piece = remaining.pop(i)
+        square = (piece.pos_y - 1) * size + piece.pos_x - 1
+        index = index * size * size + square
+    return index * 2 + (0 if side else 1)
+
+
+class Tablebase:
+    '''One table file opened through mmap, so no time is spent parsing it
+    and processes probing the same file share its pages.
+    File layout: MAGIC, version, size, number of White pieces, number
+    of Black pieces, one letter per piece, then one byte per position.'''
+    size: int
+    signature: Signature
+    header_len: int
+    data: mmap.mmap
+
+    def __init__(self, path: str):
+        # an empty file cannot be mapped, so check the size first
+        if os.path.getsize(path) < 8:
+            raise IOError(f"'{path}' is not a tablebase file")
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != MAGIC or self.data[4] != VERSION:
+            raise IOError(f"'{path}' is not a tablebase file")
+        self.size = self.data[5]
+        n_white = self.data[6]
+        n_black = self.data[7]
+        self.header_len = 8 + n_white + n_black
+        letters = self.data[8:self.header_len].decode('ascii', 'replace')
+        count = (self.size * self.size) ** (n_white + n_black) * 2
+        if len(self.data) != self.header_len + count \
+                or any(letter not in LETTER_ORDER for letter in letters):
+            raise IOError(f"'{path}' is not a tablebase file")
+        self.signature = make_signature(letters[:n_white],
+                                        letters[n_white:])
+
+    def code(self, side: bool, B: Board) -> int:
+        '''Returns the stored byte for board B with side to move'''
+        index = position_index(self.size, self.signature, side, B)
+        return self.data[self.header_len + index]
+
+
+def decode(code: int) -> tuple[str, int]:
+    '''Converts a stored byte to ('win' | 'loss' | 'draw', plies to mate)
+    >>> decode(LOSS), decode(3), decode(DRAW)
+    (('loss', 0), ('win', 3), ('draw', 0))
+    '''
+    if code == ILLEGAL:
+        raise ValueError('illegal position')
+    if code == DRAW:
+        return 'draw', 0
+    if code < LOSS:
+        return 'win', code
+    return 'loss', code - LOSS
+
+
+class TablebaseSet:
+    '''All the table files in a directory, opened when first needed.'''
+    directory: str
+    tables: dict[tuple[int, Signature], Optional[Tablebase]]
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.tables = {}
+
+    def table(self, size: int, signature: Signature) -> Optional[Tablebase]:
+        key = (size, signature)
+        if key not in self.tables:
+            path = os.path.join(self.directory,
+                                table_filename(size, signature))
+            self.tables[key] = Tablebase(path) \
+                if os.path.exists(path) else None
+        return self.tables[key]
+
+    def code(self, side: bool, B: Board) -> Optional[int]:
+        '''Returns stored byte for B with side to move, or None if there
+        is no table for the board size and pieces'''
+        table = self.table(B[0], board_signature(B))
+        return None if table is None else table.code(side, B)
+
+    def probe(self, side: bool, B: Board) -> Optional[tuple[str, int]]:
+        '''Returns result with best play for side to move on board B and
+        the number of plies to mate, or None if there is no table.'''
+        code = self.code(side, B)
+        return None if code is None else decode(code)
+
+    def best_move(self, side: bool, B: Board) -> Optional[str]:
+        '''Returns the move, as text eg. 'a1b2', that keeps the best result
+        for side: the quickest mate when winning, a drawing move when
+        drawn, and the longest resistance when losing. Returns None if
+        there is no table for the position or no legal move.'''
+        # rebuilt from text since B may come from chess_puzzle run as a
+        # script, whose classes are not the ones imported here
+        board = read_board_txt(StringIO(board_to_txt(B)))
+        code = self.code(side, board)
+        if code is None:
+            return None
+        best_key: Optional[tuple[int, int]] = None
+        best = None
+        for piece, x, y in get_all_moves(side, board):
+            move_txt = move_to_txt((piece, x, y))
+            undo = make_move(piece, x, y, board)
+            child = self.code(not side, board)
+            unmake_move(undo, board)
+            if child is None:
+                return None
+            result, plies = decode(child)
+            # rank moves: opponent lost quickest, then draw, then
+            # opponent wins slowest
+            if result == 'loss':
+                key = (0, plies)
+            elif result == 'draw':
+                key = (1, 0)
+            else:
+                key = (2, -plies)
+            if best_key is None or key < best_key:
+                best_key = key
+                best = move_txt
+        return best
+
+
+@lru_cache(maxsize=None)
+def get_tablebase_set(directory: str) -> TablebaseSet:
+    'returns the tablebase set for directory, shared by all callers'
+    return TablebaseSet(directory)
+
+
+def build_board(size: int, signature: Signature,
+                squares: list[int]) -> Board:
+    '''Creates board with the pieces of signature on squares, in order'''
+    pieces = PieceList()
+    for (letter, side), square in zip(signature, squares):
+        x = square % size + 1
+        y = square // size + 1
+        pieces.append(CONSTRUCTORS[letter](x, y, side))
+    return size, pieces
+
+
+def generate(size: int, white: str, black: str, directory: str) -> str:
+    '''Solves every position of size x size board with the given White
+    and Black pieces (each must include one King) by retrograde analysis
+    and writes the table to directory. Tables for the positions left
+    after each possible capture are generated first if missing. Returns
+    path of the file written.
+
+    Every position is set up and the rule functions give its legal moves.
+    Checkmates are lost in 0 plies. Captures lead into smaller tables,
+    which give their results straight away. Results then spread backwards
+    a ply at a time by un-moving the pieces of the side that just moved:
+    a position that can reach a lost one is won, and a position whose
+    every move reaches a won one is lost. Positions never resolved are
+    draws. Time taken grows as (size * size) to the power of the number
+    of pieces, so this is meant for 4x4 and 5x5 boards.
+    '''
+    signature = make_signature(white, black)
+    path = os.path.join(directory, table_filename(size, signature))
+    if os.path.exists(path):
+        return path
+    for i, (letter, side) in enumerate(signature):
+        if letter != 'K':
+            rest = signature[:i] + signature[i + 1:]
+            generate(size,
+                     ''.join(lt for lt, s in rest if s),
+                     ''.join(lt for lt, s in rest if not s),
+                     directory)
+    tablebases = TablebaseSet(directory)
+
+    n_squares = size * size
+    n_pieces = len(signature)
+    count = n_squares ** n_pieces * 2
+    values = bytearray([ILLEGAL]) * count
+    resolved = bytearray(count)
+    # non capturing moves whose result is still unknown
+    moves_left = [0] * count
+    # quickest mate available by a capture, 0 if none
+    capture_win = [0] * count
+    # longest a loss can be put off by captures
+    loss_floor = [0] * count
+    # whether some capture leads to a draw
+    capture_draw = bytearray(count)
+    buckets: list[list[tuple[int, bool]]] = [[] for _ in range(MAX_PLIES + 2)]
+
+    def squares_of(index: int) -> list[int]:
+        digits = []
+        index //= 2
+        for _ in range(n_pieces):
+            digits.append(index % n_squares)
+            index //= n_squares
+        digits.reverse()
+        return digits
+
+    def index_of(squares: list[int], side: bool) -> int:
+        index = 0
+        for square in squares:
+            index = index * n_squares + square
+        return index * 2 + (0 if side else 1)
+
+    def push(plies: int, index: int, is_win: bool) -> None:
+        if plies > MAX_PLIES:
+            raise ValueError(f'mate longer than {MAX_PLIES} plies')
+        buckets[plies].append((index, is_win))
+
+    # set up every position
+    for index in range(count):
+        squares = squares_of(index)
+        if len(set(squares)) < n_pieces:
+            continue
+        side = index % 2 == 0
+        board = build_board(size, signature, squares)
+        if is_check(not side, board):
+            continue
+        values[index] = DRAW
+        moves = get_all_moves(side, board)
+        if not moves:
+            if is_check(side, board):
+                push(0, index, False)
+            else:
+                resolved[index] = 1  # stalemate
+            continue
+        for piece, x, y in moves:
+            if not is_piece_at(x, y, board):
+                moves_left[index] += 1
+                continue
+            undo = make_move(piece, x, y, board)
+            child = tablebases.code(not side, board)
+            unmake_move(undo, board)
+            assert child is not None
+            result, plies = decode(child)
+            if result == 'loss':
+                if capture_win[index] == 0 or plies + 1 < capture_win[index]:
+                    capture_win[index] = plies + 1
+            elif result == 'win':
+                loss_floor[index] = max(loss_floor[index], plies + 1)
+            else:
+                capture_draw[index] = 1
+        if capture_win[index]:
+            push(capture_win[index], index, True)
+        elif moves_left[index] == 0 and not capture_draw[index]:
+            push(loss_floor[index], index, False)
+
+    # spread results backwards one ply at a time
+    for plies in range(MAX_PLIES + 1):
+        for index, is_win in buckets[plies]:
+            if resolved[index]:
+                continue
+            resolved[index] = 1
+            values[index] = plies if is_win else LOSS + plies
+            side = index % 2 == 0
+            squares = squares_of(index)
+            board = build_board(size, signature, squares)
+            # un-move each piece of the side that just moved
+            for slot, piece in enumerate(board[1]):
+                if piece.side == side:
+                    continue
+                for x, y in piece.get_destinations(board):
+                    if is_piece_at(x, y, board):
+                        continue
+                    before = squares.copy()
+                    before[slot] = (y - 1) * size + x - 1
+                    prev = index_of(before, not side)
+                    if values[prev] == ILLEGAL or resolved[prev]:
+                        continue
+                    if not is_win:
+                        push(plies + 1, prev, True)
+                    else:
+                        moves_left[prev] -= 1
+                        if moves_left[prev] == 0 \
+                                and not capture_draw[prev] \
+                                and not capture_win[prev]:
+                            push(max(plies + 1, loss_floor[prev]),
+                                 prev, False)
+
+    n_white = sum(1 for _, side in signature if side)
+    letters = ''.join(letter for letter, _ in signature)
+    header = MAGIC + bytes([VERSION, size, n_white, n_pieces - n_white]) \
+        + letters.encode('ascii')
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(values)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate endgame tablebase by retrograde analysis')
+    parser.add_argument('size', type=int, help='board size eg. 4')
+    parser.add_argument('white', help="White's pieces eg. KR")
+    parser.add_argument('black', help="Black's pieces eg. K")
+    parser.add_argument('--dir', default='.',
+                        help='directory to write table files to')
+    args = parser.parse_args()
+    print(generate(args.size, args.white.upper(), args.black.upper(),
+                   args.dir))
@@ -0,0 +1,71 @@
+import random
+import pytest
+from chess_puzzle import \
+    Board, Bishop, King, Rook, PieceList, read_board, is_check, \
+    is_checkmate, is_piece_at, ray_table
+
+np = pytest.importorskip('numpy')
+from batch import \
+    pack_boards, attack_maps, check_flags, pseudo_legal_counts, \
+    checkmate_flags  # noqa: E402
+
+SIDES = (True, False)
+
+
+def random_board(rng: random.Random, size: int) -> Board:
+    squares = rng.sample([(x, y) for x in range(1, size + 1)
+                          for y in range(1, size + 1)],
+                         min(size * size, 2 + rng.randint(0, 2 * size)))
+    pieces = PieceList()
+    for i, (x, y) in enumerate(squares):
+        side = i % 2 == 0
+        if i < 2:
+            pieces.append(King(x, y, side))
+        else:
+            pieces.append(rng.choice([Rook, Bishop])(x, y, side))
+    return size, pieces
+
+
+@pytest.mark.parametrize('size', [2, 3, 5, 8, 13, 26])
+def test_agrees_with_scalar(size: int) -> None:
+    rng = random.Random(size)
+    boards = [random_board(rng, size) for _ in range(60)]
+    planes = pack_boards(boards)
+    counts = pseudo_legal_counts(planes)
+    checks = check_flags(planes)
+    mates = checkmate_flags(boards, planes)
+    for n, board in enumerate(boards):
+        for i, side in enumerate(SIDES):
+            pieces = [p for p in board[1] if p.side == side]
+            assert counts[n, i] == \
+                sum(len(p.get_destinations(board)) for p in pieces)
+            assert checks[n, i] == is_check(side, board)
+            assert mates[n, i] == is_checkmate(side, board)
+
+
+def test_attack_maps() -> None:
+    board = read_board('board_small_valid.txt')
+    attacks = attack_maps(pack_boards([board]))
+    size = board[0]
+    for i, side in enumerate(SIDES):
+        expected = np.zeros((size, size), dtype=bool)
+        for piece in board[1]:
+            if piece.side != side:
+                continue
+            rays = ray_table(size).rays[(piece.pos_x, piece.pos_y)]
+            for direction in piece.directions:
+                # walk as far as the first piece of either side, which
+                # counts as attacked even when it cannot be captured
+                for x, y in rays[direction]:
+                    expected[y - 1, x - 1] = True
+                    if not piece.slides or is_piece_at(x, y, board):
+                        break
+        assert (attacks[0, i] == expected).all()
+
+
+def test_pack_boards_errors() -> None:
+    with pytest.raises(ValueError):
+        pack_boards([])
+    with pytest.raises(ValueError):
+        pack_boards([read_board('board_examp.txt'),
+                     read_board('board_small_valid.txt')])
@@ -0,0 +1,114 @@
+import json
+import random
+import pytest
+from chess_puzzle import board_to_txt
+from pathlib import Path
+from benchmark import \
+    FUNCTIONS, TimingParams, compare_results, generate_board, \
+    load_baseline, make_ops, percentile, run_benchmarks, run_compare, \
+    save_baseline
+
+
+def test_generate_board_repeats() -> None:
+    boards = [board_to_txt(generate_board(12, 32, random.Random(4)))
+              for _ in range(2)]
+    assert boards[0] == boards[1]
+
+
+def test_make_ops_runs_each_function() -> None:
+    boards = [generate_board(8, 16, random.Random(i)) for i in range(3)]
+    for function in FUNCTIONS:
+        ops = make_ops(function, boards, random.Random(0))
+        assert len(ops) == 3
+        for op in ops:
+            op()
+
+
+def test_percentile() -> None:
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile(samples, 100) == 100.0
+
+
+def test_run_benchmarks() -> None:
+    results = run_benchmarks((4, 8), FUNCTIONS, samples=3)
+    # sizes 4 and 8 fit 2 and 8 pieces, size 8 also fits 16 and 32
+    assert len(results) == len(FUNCTIONS) * 6
+    for r in results:
+        assert r['samples'] == 3
+        assert r['ops_per_sec'] > 0
+        assert 0 < r['p50_ns'] <= r['p99_ns']
+    json.dumps(results)
+
+
+def test_baseline_round_trip(tmp_path: Path) -> None:
+    results = run_benchmarks((4,), ('is_check', 'get_all_moves'), samples=3)
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(path, results, TimingParams((4,), 3, 0))
+    params, baseline = load_baseline(path)
+    assert params == TimingParams((4,), 3, 0)
+    assert sorted(baseline) == ['get_all_moves', 'is_check']
+    assert sorted(baseline['is_check']['4']) == ['2', '8']
+    changes = compare_results(baseline, results)
+    assert len(changes) == len(results)
+    assert all(change.ratio == 1.0 for change in changes)
+
+
+def test_compare_results_flags_slower() -> None:
+    baseline = {'is_check': {'8': {'2': {'p50_ns': 100.0, 'p99_ns': 200.0},
+                                   '8': {'p50_ns': 100.0, 'p99_ns': 200.0}}}}
+    results = [
+        {'function': 'is_check', 'size': 8, 'pieces': 2,
+         'p50_ns': 90.0, 'p99_ns': 300.0},
+        {'function': 'is_check', 'size': 8, 'pieces': 8,
+         'p50_ns': 130.0, 'p99_ns': 200.0},
+        # not in the baseline, so skipped
+        {'function': 'is_check', 'size': 12, 'pieces': 2,
+         'p50_ns': 500.0, 'p99_ns': 500.0},
+    ]
+    ratios = [c.ratio for c in compare_results(baseline, results)]
+    assert ratios == [0.9, 1.3]
+    ratios = [c.ratio for c in compare_results(baseline, results, 'p99_ns')]
+    assert ratios == [1.5, 1.0]
+
+
+def test_run_compare_exit_status(tmp_path: Path) -> None:
+    params = TimingParams((4,), 3, 0)
+    results = run_benchmarks(params.sizes, ('is_check',), params.samples,
+                             params.seed)
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(path, results, params)
+    assert run_compare(path, results, params) == 0
+    slower = [dict(r, p50_ns=r['p50_ns'] * 2) for r in results]
+    assert run_compare(path, slower, params) == 1
+
+
+def test_run_compare_fails_on_other_params(
+        tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    params = TimingParams((4,), 3, 0)
+    results = run_benchmarks(params.sizes, ('is_check',), params.samples,
+                             params.seed)
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(path, results, params)
+    for other in [params._replace(seed=1), params._replace(samples=5),
+                  params._replace(sizes=(4, 8))]:
+        assert run_compare(path, results, other) == 1
+        assert 'baseline was made with' in capsys.readouterr().err
+
+
+def test_run_compare_fails_with_nothing_to_compare(
+        tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    params = TimingParams((4,), 3, 0)
+    path = str(tmp_path / 'baseline.json')
+    save_baseline(path, run_benchmarks((4,), ('is_check',), 3), params)
+    results = run_benchmarks((4,), ('get_all_moves',), 3)
+    assert run_compare(path, results, params) == 1
+    assert 'no results to compare' in capsys.readouterr().err
+
+
+def test_load_baseline_rejects_old_format(tmp_path: Path) -> None:
+    path = tmp_path / 'baseline.json'
+    path.write_text(json.dumps({'is_check': {'4': {'2': {'p50_ns': 1.0}}}}))
+    with pytest.raises(IOError):
+        load_baseline(str(path))
@@ -0,0 +1,67 @@
+import random
+import pytest
+from io import StringIO
+from bitboard import BitBoard, move_to_bitmove
+from chess_puzzle import \
+    Board, read_board, read_board_txt, get_all_moves, is_check, \
+    is_checkmate, index2location, piece_at, Rook
+
+
+def random_board(rng: random.Random, size: int, count: int) -> Board:
+    '''Board with both kings and count - 2 rooks and bishops placed at
+    random squares of either side'''
+    squares = rng.sample(
+        [(x, y) for x in range(1, size + 1) for y in range(1, size + 1)],
+        count)
+    white: list[str] = []
+    black: list[str] = []
+    for i, (x, y) in enumerate(squares):
+        letter = 'K' if i < 2 else rng.choice('RB')
+        side = white if i == 0 or (i > 1 and rng.random() < 0.5) else black
+        side.append(letter + index2location(x, y))
+    text = f'{size}\n{", ".join(white)}\n{", ".join(black)}'
+    return read_board_txt(StringIO(text))
+
+
+def assert_same_as_board(B: Board) -> None:
+    bb = BitBoard.from_board(B)
+    for side in (True, False):
+        expected = sorted(move_to_bitmove(m) for m in get_all_moves(side, B))
+        assert bb.get_all_moves(side) == expected
+        assert bb.is_check(side) == is_check(side, B)
+        assert bb.is_checkmate(side) == is_checkmate(side, B)
+
+
+@pytest.mark.parametrize('filename', [
+    'board_examp.txt',
+    'board_small_valid.txt',
+    'board_large_fair.txt',
+    'board_large_white_adv.txt',
+])
+def test_same_as_board_fixtures(filename: str) -> None:
+    assert_same_as_board(read_board(filename))
+
+
+@pytest.mark.parametrize('size', [2, 3, 5, 8, 13, 26])
+def test_same_as_board_random(size: int) -> None:
+    rng = random.Random(size)
+    for _ in range(50):
+        count = rng.randint(2, min(size * size, 14))
+        assert_same_as_board(random_board(rng, size, count))
+
+
+def test_round_trip() -> None:
+    B = read_board('board_examp.txt')
+    size, pieces = BitBoard.from_board(B).to_board()
+    assert size == B[0]
+    assert all(p in pieces for p in B[1])
+    assert len(pieces) == len(B[1])
+
+
+def test_moved_captures() -> None:
+    B = read_board('board_small_valid.txt')
+    # black rook a4 takes white bishop a2
+    bb = BitBoard.from_board(B).moved((1, 4, 1, 2))
+    board = bb.to_board()
+    assert len(board[1]) == len(B[1]) - 1
+    assert piece_at(1, 2, board) == Rook(1, 2, False)
@@ -1,9 +1,26 @@
+import copy
+import itertools
+import json
+import pickle
+import random
+import subprocess
+import sys
+import time
 import pytest
 from io import StringIO
+from pathlib import Path
+import chess_puzzle
 from chess_puzzle import \
-    Piece, Bishop, King, Rook, Board, MSG_IOERROR, \
+    Piece, Bishop, King, Rook, Board, PieceList, MSG_IOERROR, \
     location2index, index2location, is_piece_at, piece_at, \
-    is_check, is_checkmate, read_board, conf2unicode, read_board_txt
+    is_check, is_checkmate, read_board, conf2unicode, read_board_txt, \
+    get_all_moves, make_move, unmake_move, board_hash, Searcher, \
+    MATE_SCORE, TranspositionTable, TTEntry, EXACT, perft, perft_divide, \
+    solve_mate, parse_move, iter_boards_txt, iter_boards_jsonl, read_boards, \
+    ray_table, play_game, random_policy, search_policy, CHECKMATE, NO_MOVES, \
+    QUIT, MAX_PLIES, Instrumentation, INSTRUMENTED_FUNCTIONS, \
+    INSTRUMENTED_METHODS, has_any_legal_move, iter_legal_moves, king_safety, \
+    legal_move_set, move_completer, move_to_txt, prompt_move
 
 # --------------------------------
 # Initial tests from starter code
@@ -176,6 +193,16 @@ class TestBoardCreation:
         assert not is_piece_at(4, 1, board)
         assert not is_piece_at(4, 3, board)
 
+    def test_class_symbols(self) -> None:
+        '''letter and unicode come from the class, not each piece'''
+        pieces = [King(1, 1, True), Rook(2, 1, False), Bishop(3, 1, True)]
+        assert [p.letter for p in pieces] == ['K', 'R', 'B']
+        assert [p.unicode for p in pieces] == ['\u2654', '\u265C', '\u2657']
+        for piece in pieces:
+            assert not hasattr(piece, '__dict__')
+            with pytest.raises(AttributeError):
+                setattr(piece, 'letter', 'Q')
+
     def test__eq__and__ne__(self) -> None:
         '''test overloaded == operator because it is
         important for other tests'''
@@ -746,3 +773,676 @@ class TestMovePieces:
             Kd4'''
         ))
         assert is_checkmate(False, b)
+
+    def test_square_index_in_sync_after_moves(self) -> None:
+        b = read_board_txt(StringIO(
+            '''4
+            Kd2, Ra1, Bb2
+            Rb4, Kd4'''
+        ))
+        assert isinstance(b[1], PieceList)
+        Rb4 = piece_at(2, 4, b)
+        # probing moves must leave the index unchanged
+        for x in range(1, 5):
+            for y in range(1, 5):
+                Rb4.can_move_to(x, y, b)
+        assert b[1].squares == {(p.pos_x, p.pos_y): p for p in b[1]}
+        # capture of bishop on b2
+        Rb4.move_to(2, 2, b)
+        assert b[1].squares == {(p.pos_x, p.pos_y): p for p in b[1]}
+        assert piece_at(2, 2, b) is Rb4
+        assert not is_piece_at(2, 4, b)
+
+    def test_piece_list_methods_keep_index_in_sync(self) -> None:
+        def assert_in_sync(pieces: PieceList) -> None:
+            fresh = PieceList(list(pieces))
+            assert pieces.squares == fresh.squares
+            assert pieces.positions == fresh.positions
+            assert pieces.zobrist == fresh.zobrist
+
+        pieces = PieceList([King(4, 2, True), King(4, 4, False)])
+        pieces.extend([Rook(1, 1, True), Bishop(2, 2, False)])
+        assert_in_sync(pieces)
+        assert is_piece_at(2, 2, (4, pieces))
+        del pieces[1]
+        assert_in_sync(pieces)
+        assert not is_piece_at(4, 4, (4, pieces))
+        pieces += [Rook(3, 3, False)]
+        assert_in_sync(pieces)
+        pieces[0] = King(1, 4, True)
+        assert_in_sync(pieces)
+        pieces[1:3] = [Bishop(3, 1, True)]
+        assert_in_sync(pieces)
+        del pieces[:1]
+        assert_in_sync(pieces)
+        pieces.reverse()
+        assert_in_sync(pieces)
+        pieces.sort(key=lambda p: p.pos_x)
+        assert_in_sync(pieces)
+        pieces.clear()
+        assert_in_sync(pieces)
+        assert pieces.squares == {} and pieces.zobrist == 0
+
+    @pytest.mark.parametrize('filename', [
+        'board_examp.txt',
+        'board_small_valid.txt',
+        'board_large_white_adv.txt',
+    ])
+    def test_get_destinations_matches_can_reach(self, filename: str) -> None:
+        board = read_board(filename)
+        size = board[0]
+        for piece in board[1]:
+            expected = [(x, y)
+                        for x in range(1, size + 1)
+                        for y in range(1, size + 1)
+                        if piece.can_reach(x, y, board)]
+            assert piece.get_destinations(board) == expected
+
+    @pytest.mark.parametrize('size', [2, 5, 26])
+    def test_ray_table(self, size: int) -> None:
+        table = ray_table(size)
+        assert ray_table(size) is table
+        assert len(table.rays) == size * size
+        for (x, y), rays in table.rays.items():
+            for (dx, dy), ray in rays.items():
+                expected = []
+                i = 1
+                while 0 < x + i * dx <= size and 0 < y + i * dy <= size:
+                    expected.append((x + i * dx, y + i * dy))
+                    i += 1
+                assert list(ray) == expected
+            assert table.neighbors[(x, y)] == {
+                (x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                if (dx or dy) and 0 < x + dx <= size and 0 < y + dy <= size}
+
+    @pytest.mark.parametrize('plain_list', [False, True])
+    def test_make_unmake_restores_board(self, plain_list: bool) -> None:
+        board = read_board('board_examp.txt')
+        if plain_list:
+            board = (board[0], list(board[1]))
+        order = list(board[1])
+        copy_board = self.duplicate_board(board)
+        stack = []
+        side = True
+        # play the first move available for a few plies, then take back
+        for _ in range(6):
+            piece, x, y = get_all_moves(side, board)[-1]
+            stack.append(make_move(piece, x, y, board))
+            side = not side
+        while stack:
+            unmake_move(stack.pop(), board)
+        assert board == copy_board
+        assert all(p is q for p, q in zip(board[1], order))
+        if not plain_list:
+            assert isinstance(board[1], PieceList)
+            assert board[1].squares == {
+                (p.pos_x, p.pos_y): p for p in board[1]}
+
+    def test_make_unmake_after_pickle(self) -> None:
+        '''list positions are rebuilt for the unpickled pieces'''
+        board = pickle.loads(pickle.dumps(read_board('board_small_valid.txt')))
+        assert isinstance(board[1], PieceList)
+        assert board[1].positions == {
+            id(p): i for i, p in enumerate(board[1])}
+        assert perft(board, True, 2) == perft(
+            read_board('board_small_valid.txt'), True, 2)
+        assert board == read_board('board_small_valid.txt')
+
+    def test_get_all_moves_pinned_piece(self) -> None:
+        '''
+        ♜   ♚
+             
+        ♖    
+             
+        ♔   ♝
+        '''
+        b = read_board_txt(StringIO(
+            '''5
+            Ka1, Ra3
+            Ke5, Ra5, Be1'''
+        ))
+        Ra3 = piece_at(1, 3, b)
+        moves = [(x, y) for p, x, y in get_all_moves(True, b) if p is Ra3]
+        # rook is pinned so can only move along the file
+        assert moves == [(1, 2), (1, 4), (1, 5)]
+        # agrees with testing every square with can_move_to
+        brute_force = [(p, x, y)
+                       for p in b[1] if p.side
+                       for x in range(1, 6)
+                       for y in range(1, 6)
+                       if p.can_move_to(x, y, b)]
+        assert get_all_moves(True, b) == brute_force
+
+    def test_board_hash_incremental(self) -> None:
+        board = read_board('board_large_fair.txt')
+        rng = random.Random(7)
+        stack = []
+        side = True
+        for i in range(30):
+            piece, x, y = rng.choice(get_all_moves(side, board))
+            if i % 3 == 0:
+                piece.move_to(x, y, board)
+            else:
+                stack.append(make_move(piece, x, y, board))
+            side = not side
+            # incremental hash agrees with hash calculated from scratch
+            plain = (board[0], list(board[1]))
+            assert board_hash(side, board) == board_hash(side, plain)
+        while stack:
+            unmake_move(stack.pop(), board)
+            assert board_hash(True, board) == board_hash(
+                True, (board[0], list(board[1])))
+
+    def test_board_hash_is_deterministic(self) -> None:
+        # keys are seeded so this never changes between runs or processes
+        board = read_board('board_examp.txt')
+        assert board_hash(True, board) == 11445237586646804706
+
+    def test_board_hash_after_deepcopy(self) -> None:
+        board = copy.deepcopy(read_board('board_examp.txt'))
+        assert board_hash(True, board) == 11445237586646804706
+        assert board_hash(True, board) == board_hash(
+            True, (board[0], list(board[1])))
+
+    def test_board_hash_after_pickle(self) -> None:
+        board = pickle.loads(pickle.dumps(read_board('board_examp.txt')))
+        assert board_hash(True, board) == 11445237586646804706
+        piece_at(4, 3, board).move_to(4, 2, board)
+        assert board_hash(True, board) == board_hash(
+            True, (board[0], list(board[1])))
+
+
+# --------------------------------
+# Test computer player search
+# --------------------------------
+class TestSearch:
+    def test_search_finds_mate_in_one(self) -> None:
+        '''
+           ♜
+          ♚ 
+        ♔   
+        ♖♖  
+        '''
+        b = read_board_txt(StringIO(
+            '''4
+            Ka2, Ra1, Rb1
+            Kc3, Rd4'''
+        ))
+        result = Searcher().search(False, b, depth=3)
+        assert result.score == MATE_SCORE - 1
+        assert result.move is not None
+        piece, x, y = result.move
+        piece.move_to(x, y, b)
+        assert is_checkmate(True, b)
+
+    def test_search_leaves_board_unchanged(self) -> None:
+        board = read_board('board_examp.txt')
+        order = list(board[1])
+        copy_board = TestMovePieces().duplicate_board(board)
+        result = Searcher().search(True, board, depth=3)
+        assert board == copy_board
+        assert all(p is q for p, q in zip(board[1], order))
+        assert result.nodes > 0
+        assert result.move in get_all_moves(True, board)
+
+    @pytest.mark.parametrize('budget_ms', [1, 20, 200])
+    def test_search_timed_within_budget(self, budget_ms: int) -> None:
+        board = read_board('board_large_fair.txt')
+        copy_board = TestMovePieces().duplicate_board(board)
+        result = Searcher().search_timed(False, board, budget_ms)
+        # small margin for the node that notices the deadline
+        assert result.seconds < budget_ms / 1000 + 0.05
+        assert board == copy_board
+        assert result.move in get_all_moves(False, board)
+
+    def test_search_timed_stops_at_mate(self) -> None:
+        b = read_board_txt(StringIO(
+            '''4
+            Ka2, Ra1, Rb1
+            Kc3, Rd4'''
+        ))
+        result = Searcher().search_timed(False, b, 10000)
+        assert result.score == MATE_SCORE - 1
+        assert result.seconds < 5
+
+    def test_transposition_table_replacement(self) -> None:
+        tt = TranspositionTable(1)
+        # tiny memory cap still gives one bucket of two slots
+        assert len(tt.slots) == 2
+        tt.store(TTEntry(1, 5, EXACT, 0, None))
+        # shallower entry goes in the always replace slot
+        tt.store(TTEntry(2, 3, EXACT, 0, None))
+        tt.store(TTEntry(3, 2, EXACT, 0, None))
+        assert tt.probe(1) is not None
+        assert tt.probe(2) is None
+        assert tt.probe(3) is not None
+        # deeper entry takes the depth preferred slot
+        tt.store(TTEntry(4, 6, EXACT, 0, None))
+        assert tt.probe(1) is None
+        assert tt.probe(4) is not None
+        assert len(tt.slots) == 2
+        assert tt.stats()['overwrites'] == 2
+        assert tt.hits == 3 and tt.misses == 2
+
+    def test_search_with_transposition_table(self) -> None:
+        b = read_board_txt(StringIO(
+            '''4
+            Ka2, Ra1, Rb1
+            Kc3, Rd4'''
+        ))
+        tt = TranspositionTable(2**20)
+        result = Searcher(tt).search_timed(False, b, 10000, max_depth=4)
+        assert result.score == MATE_SCORE - 1
+        board = read_board('board_examp.txt')
+        copy_board = TestMovePieces().duplicate_board(board)
+        result = Searcher(tt).search(True, board, 4)
+        assert board == copy_board
+        assert tt.stores > 0
+
+
+# --------------------------------
+# Test move generation with perft
+# --------------------------------
+class TestPerft:
+    # counts found with the original move generator, which scanned every
+    # square of the board with can_move_to
+    @pytest.mark.parametrize('filename, side, depth, nodes', [
+        ('board_examp.txt', True, 1, 14),
+        ('board_examp.txt', True, 2, 147),
+        ('board_examp.txt', True, 3, 1456),
+        ('board_examp.txt', True, 4, 15021),
+        ('board_examp.txt', False, 4, 14000),
+        ('board_small_valid.txt', True, 1, 8),
+        ('board_small_valid.txt', True, 2, 68),
+        ('board_small_valid.txt', True, 3, 534),
+        ('board_small_valid.txt', True, 4, 3991),
+        ('board_small_valid.txt', False, 4, 4180),
+        ('board_large_fair.txt', True, 1, 101),
+        ('board_large_fair.txt', True, 2, 9743),
+        ('board_large_fair.txt', True, 3, 958300),
+    ])
+    def test_perft_known_counts(self, filename: str, side: bool,
+                                depth: int, nodes: int) -> None:
+        board = read_board(filename)
+        copy_board = TestMovePieces().duplicate_board(board)
+        assert perft(board, side, depth) == nodes
+        assert board == copy_board
+
+    def test_perft_divide(self) -> None:
+        board = read_board('board_examp.txt')
+        result = perft_divide(board, True, 3)
+        assert result.nodes == 1456
+        assert sum(result.divide.values()) == result.nodes
+        assert len(result.divide) == 14
+        assert result.nodes_per_second > 0
+
+
+class TestSolveMate:
+    def play_line(self, B: Board, side: bool, moves: list[str]) -> None:
+        for move_txt in moves:
+            move = parse_move(move_txt, side, B)
+            assert move is not None
+            piece, x, y = move
+            piece.move_to(x, y, B)
+            side = not side
+
+    def test_mate_in_two(self) -> None:
+        board = read_board_txt(StringIO('''8
+Kf6, Ra1
+Kh8'''))
+        copy_board = TestMovePieces().duplicate_board(board)
+        lines = solve_mate(board, True, 2)
+        assert board == copy_board
+        assert [line.moves[0] for line in lines] == ['f6f7', 'f6g6']
+        # quickest mates are listed first
+        assert solve_mate(board, True, 3)[:2] == lines
+        for line in lines:
+            assert line.mate_in == 2
+            assert len(line.moves) == 3
+            b = TestMovePieces().duplicate_board(board)
+            self.play_line(b, True, line.moves)
+            assert is_checkmate(False, b)
+
+    def test_lines_agree_with_search(self) -> None:
+        board = read_board('board_examp.txt')
+        lines = solve_mate(board, False, 2)
+        assert [str(line) for line in lines] == [
+            'mate in 1: e4c4', 'mate in 2: b4c4 c5b5 d3d5']
+        result = Searcher().search(False, board, 3)
+        assert result.score == MATE_SCORE - 1
+
+    def test_no_mate(self) -> None:
+        board = read_board_txt(StringIO('''8
+Ke1, Ra1
+Ke8'''))
+        assert solve_mate(board, True, 2) == []
+        # quiet moves cannot mate so are not even tried for mate in 1
+        assert solve_mate(read_board('board_small_valid.txt'), True, 1) == []
+
+    def test_other_side_in_check(self) -> None:
+        board = read_board_txt(StringIO('''4
+Ka1, Rd2
+Kd4'''))
+        with pytest.raises(ValueError):
+            solve_mate(board, True, 1)
+
+
+class TestReadBoards:
+    def test_concatenated(self) -> None:
+        stream = StringIO('''5
+Ba1, Ra2, Be2, Ra5, Kc5
+Kb3, Rd3, Rb4, Re4
+
+
+4
+Kd2, Kd3
+Kd4
+4
+Kd2
+Kd4
+4
+Kd2''')
+        records = list(iter_boards_txt(stream))
+        assert [r.line for r in records] == [1, 6, 9, 12]
+        assert records[0].board == read_board('board_examp.txt')
+        assert records[1].board is None
+        assert 'line 6' in str(records[1].error)
+        assert records[2].board == read_board_txt(StringIO('4\nKd2\nKd4'))
+        assert records[3].board is None
+        assert records[3].error is not None
+
+    def test_truncated_record_in_middle(self) -> None:
+        names = ['board_examp.txt', 'board_missing_row.txt',
+                 'board_examp.txt', 'board_small_valid.txt']
+        texts = [Path(name).read_text() for name in names]
+        records = list(iter_boards_txt(StringIO('\n'.join(texts))))
+        assert [r.line for r in records] == [1, 5, 7, 11]
+        assert records[1].board is None
+        assert 'line 5' in str(records[1].error)
+        assert records[0].board == read_board('board_examp.txt')
+        assert records[2].board == read_board('board_examp.txt')
+        assert records[3].board == read_board('board_small_valid.txt')
+
+    def test_jsonl(self) -> None:
+        with open('board_examp.txt') as f:
+            board_txt = f.read()
+        stream = StringIO(json.dumps(board_txt) + '\n\nnot json\n'
+                          + json.dumps(['4', 'Kd2', 'Kd4']) + '\n'
+                          + json.dumps('4\nKd2\nKa5') + '\n')
+        records = list(iter_boards_jsonl(stream))
+        assert [r.line for r in records] == [1, 3, 4, 5]
+        assert records[0].board == read_board('board_examp.txt')
+        assert all(r.board is None and isinstance(r.error, IOError)
+                   for r in records[1:])
+
+    def test_reads_lazily(self) -> None:
+        # endless input, so reading it all would never return
+        lines = itertools.cycle(['4\n', 'Kd2\n', 'Kd4\n'])
+        records = list(itertools.islice(iter_boards_txt(lines), 3))
+        assert [r.line for r in records] == [1, 4, 7]
+        assert all(r.error is None for r in records)
+
+    def test_read_boards(self, tmp_path: Path) -> None:
+        txt_file = tmp_path / 'boards.txt'
+        jsonl_file = tmp_path / 'boards.jsonl'
+        with open('board_small_valid.txt') as f:
+            board_txt = f.read()
+        txt_file.write_text(board_txt + '\n' + board_txt)
+        jsonl_file.write_text(json.dumps(board_txt) + '\n')
+        expected = read_board('board_small_valid.txt')
+        assert [r.board for r in read_boards(str(txt_file))] == \
+            [expected, expected]
+        assert [r.board for r in read_boards(str(jsonl_file))] == [expected]
+
+
+class TestHasAnyLegalMove:
+    @pytest.mark.parametrize('seed', range(5))
+    def test_matches_get_all_moves(self, seed: int) -> None:
+        rng = random.Random(seed)
+        board = read_board('board_large_fair.txt')
+        side = True
+        for _ in range(40):
+            moves = get_all_moves(side, board)
+            info = king_safety(side, board)
+            assert list(iter_legal_moves(side, board, info)) == moves
+            assert has_any_legal_move(side, board) == bool(moves)
+            if not moves:
+                break
+            piece, x, y = rng.choice(moves)
+            piece.move_to(x, y, board)
+            side = not side
+
+    def test_double_check_only_king_moves(self) -> None:
+        # Black Ke5 is checked by Re1 and Bc3, Ra4 cannot block both
+        board = read_board_txt(StringIO('''5
+Ka1, Re1, Bc3
+Ra4, Ke5'''))
+        moves = get_all_moves(False, board)
+        assert moves and all(type(p) is King for p, x, y in moves)
+        assert has_any_legal_move(False, board)
+
+
+class TestLegalMoveSet:
+    def test_matches_get_all_moves(self) -> None:
+        board = read_board('board_examp.txt')
+        for side in (True, False):
+            moves = legal_move_set(side, board)
+            assert moves == {move_to_txt(move): move
+                             for move in get_all_moves(side, board)}
+            assert legal_move_set(side, board) is moves
+
+    def test_move_to_clears_cache(self) -> None:
+        board = read_board('board_examp.txt')
+        moves = legal_move_set(True, board)
+        piece, x, y = moves['a5a4']
+        piece.move_to(x, y, board)
+        assert isinstance(board[1], PieceList)
+        assert board[1].move_set is None
+        # the rook on a4 now stands in the way of the rook on a2
+        assert 'a2a4' in moves
+        assert 'a2a4' not in legal_move_set(True, board)
+        assert parse_move('a2a4', True, board) is None
+
+    def test_parse_move_plain_list(self) -> None:
+        '''boards that are plain lists check the one move typed'''
+        board = read_board('board_examp.txt')
+        plain = (board[0], list(board[1]))
+        for move_txt in ['a5a4', 'a2a4', 'b3b2', 'c5d5', 'a01a3', 'a1a3']:
+            for side in (True, False):
+                assert parse_move(move_txt, side, plain) == \
+                    parse_move(move_txt, side, board)
+        assert parse_move('a5a4', True, plain) == \
+            (piece_at(1, 5, plain), 1, 4)
+
+    def test_make_move_is_not_served_stale(self) -> None:
+        board = read_board('board_examp.txt')
+        moves = legal_move_set(True, board)
+        undo = make_move(piece_at(1, 5, board), 1, 4, board)
+        assert legal_move_set(True, board) != moves
+        unmake_move(undo, board)
+        assert legal_move_set(True, board) == moves
+
+    @pytest.mark.parametrize('seed', range(5))
+    def test_parse_move_agrees_with_can_move_to(self, seed: int) -> None:
+        rng = random.Random(seed)
+        board = read_board('board_examp.txt')
+        size = board[0]
+        squares = [index2location(x, y) for x in range(1, size + 1)
+                   for y in range(1, size + 1)]
+        to_move = True
+        for _ in range(100):
+            source, dest = rng.choice(squares), rng.choice(squares)
+            side = rng.choice([True, False])
+            x0, y0 = location2index(source)
+            x1, y1 = location2index(dest)
+            expected = is_piece_at(x0, y0, board) \
+                and piece_at(x0, y0, board).side == side \
+                and piece_at(x0, y0, board).can_move_to(x1, y1, board)
+            move = parse_move(source + dest, side, board)
+            assert (move is not None) == expected
+            if rng.random() < 0.2:
+                moves = get_all_moves(to_move, board)
+                if not moves:
+                    break
+                piece, x, y = rng.choice(moves)
+                piece.move_to(x, y, board)
+                to_move = not to_move
+
+    def test_move_completer(self) -> None:
+        complete = move_completer(['QUIT', 'b2b3', 'a1c3', 'a1b2'])
+        assert complete('', 0) == 'QUIT'
+        assert [complete('a', i) for i in range(3)] == ['a1b2', 'a1c3', None]
+        assert complete('c', 0) is None
+
+    def test_prompt_move(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        board = read_board('board_examp.txt')
+        inputs = iter(['a1a5', 'z9z9', 'a5a4'])
+        monkeypatch.setattr('builtins.input', lambda prompt: next(inputs))
+        move = prompt_move(True, board)
+        assert move == (piece_at(1, 5, board), 1, 4)
+
+
+class TestPlayGame:
+    def test_seeded_games_repeat(self) -> None:
+        results = [play_game(read_board('board_examp.txt'),
+                             random_policy(7), random_policy(8), 60)
+                   for _ in range(2)]
+        assert results[0].moves == results[1].moves
+        assert results[0].board == results[1].board
+
+    @pytest.mark.parametrize('seed', range(10))
+    def test_moves_replay(self, seed: int) -> None:
+        result = play_game(read_board('board_small_valid.txt'),
+                           random_policy(seed), random_policy(-seed), 50)
+        board = read_board('board_small_valid.txt')
+        side = True
+        for move_txt in result.moves:
+            move = parse_move(move_txt, side, board)
+            assert move is not None
+            piece, x, y = move
+            piece.move_to(x, y, board)
+            side = not side
+        assert board == result.board
+        assert result.plies == len(result.moves) <= 50
+        if result.reason == CHECKMATE:
+            assert is_checkmate(side, board)
+            assert result.winner == (not side)
+        elif result.reason == NO_MOVES:
+            assert get_all_moves(side, board) == []
+            assert result.winner is None
+        else:
+            assert result.reason == MAX_PLIES
+            assert result.winner is None
+
+    def test_no_moves(self) -> None:
+        board = read_board_txt(StringIO('''4
+Ka1
+Kc2, Bb3'''))
+        result = play_game(board, random_policy(), random_policy())
+        assert result == (NO_MOVES, None, [], board)
+
+    def test_quit(self) -> None:
+        result = play_game(read_board('board_small_valid.txt'),
+                           search_policy(1), lambda side, B: None)
+        assert result.reason == QUIT
+        assert result.plies == 1
+
+    def test_invalid_move(self) -> None:
+        board = read_board('board_examp.txt')
+        with pytest.raises(ValueError):
+            # moves the Black king for White
+            play_game(board, lambda side, B: (piece_at(2, 3, B), 2, 2),
+                      random_policy())
+
+
+class TestInstrumentation:
+    def test_counts_and_uninstalls(self) -> None:
+        originals = [Rook.can_reach, Bishop.is_leap_over, King.can_move_to,
+                     chess_puzzle.is_check]
+        stats = Instrumentation()
+        stats.install()
+        try:
+            assert Rook.can_reach is not originals[0]
+            board = read_board('board_examp.txt')
+            play_game(board, random_policy(3), random_policy(4), 6)
+            stats.end_turn()
+            piece_at(1, 5, board).can_move_to(1, 4, board)
+            stats.end_turn()
+        finally:
+            stats.uninstall()
+        assert [Rook.can_reach, Bishop.is_leap_over, King.can_move_to,
+                chess_puzzle.is_check] == originals
+        assert len(stats.turns) == 2
+        assert stats.turns[0]['get_all_moves'] == 6
+        assert stats.turns[1]['get_all_moves'] == 0
+        assert stats.turns[1]['can_move_to'] == 1
+        assert stats.turn_ns[1]['can_move_to'] > 0
+        assert stats.turn_ns[1]['get_all_moves'] == 0
+        summary = stats.summary()
+        for name in INSTRUMENTED_FUNCTIONS + INSTRUMENTED_METHODS:
+            assert name in summary
+
+    def test_search_and_keyword_calls(self) -> None:
+        stats = Instrumentation()
+        stats.install()
+        try:
+            board = read_board('board_examp.txt')
+            start = time.perf_counter_ns()
+            Searcher().search(False, board, 2)
+            search_ns = time.perf_counter_ns() - start
+            stats.end_turn()
+            assert chess_puzzle.piece_at(pos_X=3, pos_Y=5, B=board) == \
+                King(3, 5, True)
+            stats.end_turn()
+        finally:
+            stats.uninstall()
+        search = stats.turns[0]
+        assert search['negamax'] > 1
+        assert search['evaluate'] > 0
+        assert search['king_safety'] > 0
+        assert search['walk_rays'] > 0
+        assert search['is_piece_at'] > 0
+        # recursive negamax calls are timed once, so within the search
+        assert 0 < stats.turn_ns[0]['negamax'] <= search_ns
+        assert stats.turns[1]['piece_at'] == 1
+
+    def test_main_prints_summary_on_quit(
+            self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+            capsys: pytest.CaptureFixture[str]) -> None:
+        (tmp_path / 'start.txt').write_text(
+            Path('board_examp.txt').read_text())
+        inputs = iter(['start.txt', 'e2d1', 'QUIT', 'saved.txt'])
+        monkeypatch.setattr('builtins.input', lambda prompt: next(inputs))
+        monkeypatch.setattr(chess_puzzle, 'FILEPATH', f'{tmp_path}/')
+        stats = Instrumentation()
+        monkeypatch.setattr(chess_puzzle, 'INSTRUMENTATION', stats)
+        stats.install()
+        try:
+            chess_puzzle.main()
+        finally:
+            stats.uninstall()
+        # White's move, Black's move and the start of White's next turn
+        assert 'Instrumentation over 3 turns:' in capsys.readouterr().out
+        assert (tmp_path / 'saved.txt').exists()
+
+
+class TestCommandLine:
+    @pytest.mark.parametrize('depth', ['x', '-1', '2.5'])
+    def test_perft_rejects_bad_depth(self, depth: str) -> None:
+        result = subprocess.run(
+            [sys.executable, 'chess_puzzle.py', '--perft',
+             'board_examp.txt', depth],
+            capture_output=True, text=True, timeout=60)
+        assert result.returncode == 2
+        assert '--perft DEPTH must be a whole number' in result.stderr
+        assert 'Traceback' not in result.stderr
+
+    @pytest.mark.parametrize('moves', ['x', '0', '-2'])
+    def test_mate_rejects_bad_move_count(self, moves: str) -> None:
+        result = subprocess.run(
+            [sys.executable, 'chess_puzzle.py', '--mate',
+             'board_examp.txt', moves],
+            capture_output=True, text=True, timeout=60)
+        assert result.returncode == 2
+        assert '--mate N must be a positive whole number' in result.stderr
+        assert 'Traceback' not in result.stderr
@@ -0,0 +1,84 @@
+import pytest
+from pathlib import Path
+from chess_puzzle import read_board, read_boards
+from corpus import \
+    Corpus, encode_board, decode_board, write_corpus, text_to_corpus, \
+    corpus_to_text
+
+VALID_BOARDS = ['board_examp.txt', 'board_small_valid.txt',
+                'board_large_fair.txt', 'board_large_white_adv.txt']
+
+
+@pytest.mark.parametrize('filename', VALID_BOARDS)
+def test_encode_decode(filename: str) -> None:
+    board = read_board(filename)
+    data = encode_board(board)
+    assert len(data) == 1 + 3 * len(board[1])
+    assert decode_board(data) == board
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    bytes.fromhex('1b 01 00 05 00 00 0d'),  # size 27
+    bytes.fromhex('04 01 00 05 00 00'),  # cut short
+    bytes.fromhex('04 01 00 05 00 00 10'),  # off the board
+    bytes.fromhex('04 01 00 05 00 00 05'),  # two pieces on a square
+    bytes.fromhex('04 01 00 05 06 00 0d'),  # no such piece type
+    bytes.fromhex('04 01 00 05 03 00 0d'),  # no black king
+    bytes.fromhex('04 01 00 05 00 00 0d 01 00 00'),  # two white kings
+])
+def test_decode_invalid(data: bytes) -> None:
+    with pytest.raises(IOError):
+        decode_board(data)
+
+
+def test_corpus_random_access(tmp_path: Path) -> None:
+    path = str(tmp_path / 'boards.cpbc')
+    boards = [read_board(filename) for filename in VALID_BOARDS]
+    assert write_corpus(path, boards) == len(boards)
+    with Corpus(path) as corpus:
+        assert len(corpus) == len(boards)
+        assert corpus[2] == boards[2]
+        assert corpus[-1] == boards[-1]
+        assert list(corpus) == boards
+        with pytest.raises(IndexError):
+            corpus[len(boards)]
+
+
+def test_empty_corpus(tmp_path: Path) -> None:
+    path = str(tmp_path / 'empty.cpbc')
+    assert write_corpus(path, []) == 0
+    with Corpus(path) as corpus:
+        assert list(corpus) == []
+
+
+def test_not_a_corpus() -> None:
+    with pytest.raises(IOError):
+        Corpus('board_examp.txt')
+
+
+def test_empty_or_cut_short_file(tmp_path: Path) -> None:
+    path = tmp_path / 'boards.cpbc'
+    write_corpus(str(path), [read_board(name) for name in VALID_BOARDS])
+    data = path.read_bytes()
+    for length in [0, 3, len(data) // 2, len(data) - 1]:
+        path.write_bytes(data[:length])
+        with pytest.raises(IOError, match='is not a corpus file'):
+            Corpus(str(path))
+
+
+def test_text_round_trip(tmp_path: Path) -> None:
+    txt_file = tmp_path / 'boards.txt'
+    txt_file.write_text('\n'.join(Path(filename).read_text()
+                                  for filename in VALID_BOARDS))
+    path = str(tmp_path / 'boards.cpbc')
+    assert text_to_corpus(str(txt_file), path) == len(VALID_BOARDS)
+    out_file = str(tmp_path / 'out.txt')
+    assert corpus_to_text(path, out_file) == len(VALID_BOARDS)
+    assert [r.board for r in read_boards(out_file)] == \
+        [read_board(filename) for filename in VALID_BOARDS]
+
+
+def test_text_to_corpus_invalid(tmp_path: Path) -> None:
+    with pytest.raises(IOError):
+        text_to_corpus('board_two_coincide.txt', str(tmp_path / 'x.cpbc'))
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from chess_puzzle import read_board, perft_divide, Searcher
+from parallel import parallel_perft, parallel_search
+
+
+@pytest.mark.parametrize('filename, depth', [
+    ('board_examp.txt', 3),
+    ('board_small_valid.txt', 3),
+    ('board_large_fair.txt', 2),
+])
+def test_parallel_perft_same_as_serial(filename: str, depth: int) -> None:
+    board = read_board(filename)
+    serial = perft_divide(board, True, depth)
+    parallel = parallel_perft(board, True, depth, workers=2)
+    assert parallel.nodes == serial.nodes
+    # same moves in the same order
+    assert list(parallel.divide.items()) == list(serial.divide.items())
+
+
+@pytest.mark.parametrize('filename, side', [
+    ('board_examp.txt', False),
+    ('board_small_valid.txt', True),
+])
+def test_parallel_search_same_score(filename: str, side: bool) -> None:
+    board = read_board(filename)
+    serial = Searcher().search(side, board, 3)
+    parallel = parallel_search(board, side, 3, workers=2)
+    assert parallel.score == serial.score
+    assert parallel.move is not None
+    # the piece to move is the one on the board passed in
+    assert any(parallel.move[0] is piece for piece in board[1])
+
+
+def test_analyse_from_command_line() -> None:
+    '''chess_puzzle run as a script has its own copies of the classes,
+    which the workers must not rely on'''
+    result = subprocess.run(
+        [sys.executable, 'chess_puzzle.py', '--analyse', 'board_examp.txt',
+         '--workers', '2'],
+        capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert 'White: depth 2 score 99999 move a5a3' in result.stdout
+    assert 'Black: depth 2' in result.stdout
+
+
+def test_analyse_without_moves_from_command_line(tmp_path: Path) -> None:
+    '''White to move is stalemated, so there are no root moves to share
+    out'''
+    path = tmp_path / 'stale.txt'
+    path.write_text('4\nKa1\nKc2, Bb3\n')
+    result = subprocess.run(
+        [sys.executable, 'chess_puzzle.py', '--analyse', str(path),
+         '--workers', '2'],
+        capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert 'White: depth' in result.stdout
+    assert 'Black: depth' in result.stdout
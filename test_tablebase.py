@@ -0,0 +1,107 @@
+import pytest
+from io import StringIO
+from pathlib import Path
+import chess_puzzle
+from chess_puzzle import \
+    read_board_txt, get_all_moves, is_check, is_checkmate, make_move, \
+    unmake_move, parse_move, find_black_move
+from tablebase import \
+    Tablebase, TablebaseSet, generate, decode, build_board, \
+    make_signature, ILLEGAL
+
+
+@pytest.fixture(scope='module')
+def table_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    directory = tmp_path_factory.mktemp('tables')
+    generate(4, 'KR', 'K', str(directory))
+    generate(4, 'K', 'KR', str(directory))
+    return directory
+
+
+def test_generate_writes_sub_tables(table_dir: Path) -> None:
+    names = sorted(p.name for p in table_dir.iterdir())
+    assert names == ['4x4_KRvK.cptb', '4x4_KvK.cptb', '4x4_KvKR.cptb']
+
+
+@pytest.mark.parametrize('white, black', [('KR', 'K'), ('K', 'KR')])
+def test_values_agree_with_moves(table_dir: Path,
+                                 white: str, black: str) -> None:
+    '''every position's result follows from the results of its moves'''
+    tables = TablebaseSet(str(table_dir))
+    signature = make_signature(white, black)
+    table = tables.table(4, signature)
+    assert table is not None
+    for index in range(0, 16 ** len(signature) * 2, 7):
+        side = index % 2 == 0
+        squares: list[int] = []
+        rest = index // 2
+        for _ in signature:
+            squares.insert(0, rest % 16)
+            rest //= 16
+        if len(set(squares)) < len(squares):
+            continue
+        board = build_board(4, signature, squares)
+        code = table.code(side, board)
+        if is_check(not side, board):
+            assert code == ILLEGAL
+            continue
+        children = []
+        for piece, x, y in get_all_moves(side, board):
+            undo = make_move(piece, x, y, board)
+            child = tables.code(not side, board)
+            unmake_move(undo, board)
+            assert child is not None
+            children.append(decode(child))
+        if not children:
+            expected = ('loss', 0) if is_check(side, board) else ('draw', 0)
+        elif any(result == 'loss' for result, _ in children):
+            expected = ('win', 1 + min(
+                plies for result, plies in children if result == 'loss'))
+        elif all(result == 'win' for result, _ in children):
+            expected = ('loss', 1 + max(plies for _, plies in children))
+        else:
+            expected = ('draw', 0)
+        assert decode(code) == expected
+
+
+def test_computer_plays_perfect_endgame(
+        table_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(chess_puzzle, 'TABLEBASE_DIR', str(table_dir))
+    board = read_board_txt(StringIO('''4
+        Kd4
+        Ka1, Rc3'''))
+    tables = TablebaseSet(str(table_dir))
+    result = tables.probe(False, board)
+    assert result is not None and result[0] == 'win'
+    side = False
+    for _ in range(result[1]):
+        if side:
+            # white defends as long as possible
+            move_txt = tables.best_move(True, board)
+            assert move_txt is not None
+            move = parse_move(move_txt, True, board)
+        else:
+            move = find_black_move(board)
+        assert move is not None
+        piece, x, y = move
+        piece.move_to(x, y, board)
+        side = not side
+    assert is_checkmate(True, board)
+
+
+def test_empty_or_cut_short_file(table_dir: Path, tmp_path: Path) -> None:
+    data = (table_dir / '4x4_KRvK.cptb').read_bytes()
+    path = tmp_path / '4x4_KRvK.cptb'
+    for length in [0, 5, 9, len(data) - 1]:
+        path.write_bytes(data[:length])
+        with pytest.raises(IOError, match='is not a tablebase file'):
+            Tablebase(str(path))
+
+
+def test_no_table_gives_none(table_dir: Path) -> None:
+    board = read_board_txt(StringIO('''4
+        Kd4, Bb1
+        Ka1, Rc3'''))
+    tables = TablebaseSet(str(table_dir))
+    assert tables.probe(True, board) is None
+    assert tables.best_move(True, board) is None
@@ -0,0 +1,46 @@
+import json
+import pytest
+from tournament import \
+    default_boards, make_policy, play_task, run_tournament, PHASES
+
+
+def test_default_boards() -> None:
+    assert default_boards() == [
+        'board_examp.txt', 'board_large_fair.txt',
+        'board_large_white_adv.txt', 'board_small_valid.txt']
+
+
+def test_play_task_repeats() -> None:
+    task = ('board_examp.txt', 3, 'random', 'search:1', 60)
+    first = play_task(task)
+    second = play_task(task)
+    assert first['outcome'] == second['outcome']
+    assert first['plies'] == second['plies']
+    assert set(first['cpu']) == set(PHASES)
+
+
+def test_unknown_strategy() -> None:
+    with pytest.raises(ValueError):
+        make_policy('minimax', 0)
+    with pytest.raises(ValueError):
+        run_tournament(['board_examp.txt'], 1, 'random', 'best', workers=1)
+
+
+def test_run_tournament() -> None:
+    boards = ['board_examp.txt', 'board_small_valid.txt']
+    stats = run_tournament(boards, 6, 'random', 'random', 40, seed=5,
+                           workers=2)
+    again = run_tournament(boards, 6, 'random', 'random', 40, seed=5,
+                           workers=1)
+    # results only depend on the seeds, though CPU times vary
+    for board in boards:
+        del stats['boards'][board]['cpu_seconds']
+        del again['boards'][board]['cpu_seconds']
+    assert stats['boards'] == again['boards']
+    total = stats['total']
+    assert total['games'] == 12
+    assert sum(total[f'{outcome}_rate'] for outcome in
+               ('white_win', 'black_win', 'draw', 'timeout')) == \
+        pytest.approx(1.0)
+    assert 0 < total['average_plies'] <= 40
+    json.dumps(stats)
@@ -0,0 +1,162 @@
+import argparse
+import glob
+import json
+import time
+from multiprocessing import Pool
+from typing import Any, Optional
+
+from chess_puzzle import \
+    Board, Piece, Policy, CHECKMATE, NO_MOVES, MAX_PLIES, play_game, \
+    random_policy, read_board, search_policy
+
+# one game handed to a worker: board file, game seed, White's and Black's
+# strategy and the ply limit
+Task = tuple[str, int, str, str, int]
+# CPU time is split into reading the board, each side's policy choosing
+# moves, and the rules: checking for the end of the game and for valid
+# moves and playing them
+PHASES = ('setup', 'white', 'black', 'rules')
+
+
+def make_policy(strategy: str, seed: int) -> Policy:
+    '''Policy for a strategy name: 'random' plays random valid moves and
+    'search:N' plays the best move searching N plies ahead.
+    Example:
+    >>> make_policy('search:x', 0)
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown strategy 'search:x'
+    '''
+    if strategy == 'random':
+        return random_policy(seed)
+    name, _, depth = strategy.partition(':')
+    if name == 'search' and depth.isdigit():
+        return search_policy(int(depth))
+    raise ValueError(f"unknown strategy '{strategy}'")
+
+
+def timed(policy: Policy, cpu: dict[str, float], phase: str) -> Policy:
+    'wraps policy to add the CPU time it takes to cpu[phase]'
+    def wrapper(side: bool, B: Board) -> Optional[tuple[Piece, int, int]]:
+        start = time.process_time()
+        move = policy(side, B)
+        cpu[phase] += time.process_time() - start
+        return move
+    return wrapper
+
+
+def play_task(task: Task) -> dict[str, Any]:
+    '''Plays one game and returns its board file, result, plies and the
+    CPU seconds spent in each phase'''
+    filename, seed, white, black, max_plies = task
+    cpu = dict.fromkeys(PHASES, 0.0)
+    start = time.process_time()
+    board = read_board(filename)
+    # separate seeds so both sides do not play the same random sequence
+    white_policy = timed(make_policy(white, 2 * seed), cpu, 'white')
+    black_policy = timed(make_policy(black, 2 * seed + 1), cpu, 'black')
+    cpu['setup'] = time.process_time() - start
+    start = time.process_time()
+    result = play_game(board, white_policy, black_policy, max_plies)
+    cpu['rules'] = time.process_time() - start - cpu['white'] - cpu['black']
+    if result.reason == CHECKMATE:
+        outcome = 'white_win' if result.winner else 'black_win'
+    elif result.reason == NO_MOVES:
+        outcome = 'draw'
+    elif result.reason == MAX_PLIES:
+        outcome = 'timeout'
+    else:
+        outcome = result.reason
+    return {'board': filename, 'outcome': outcome, 'plies': result.plies,
+            'cpu': cpu}
+
+
+def summarise(games: list[dict[str, Any]]) -> dict[str, Any]:
+    'rates of each outcome, average plies and total CPU time per phase'
+    count = len(games)
+    outcomes = ('white_win', 'black_win', 'draw', 'timeout')
+    summary: dict[str, Any] = {'games': count}
+    for outcome in outcomes:
+        wins = sum(1 for game in games if game['outcome'] == outcome)
+        summary[f'{outcome}_rate'] = wins / count if count else 0.0
+    summary['average_plies'] = \
+        sum(game['plies'] for game in games) / count if count else 0.0
+    summary['cpu_seconds'] = {
+        phase: round(sum(game['cpu'][phase] for game in games), 6)
+        for phase in PHASES}
+    return summary
+
+
+def default_boards() -> list[str]:
+    '''Every board_*.txt file in the current directory that is a valid
+    board'''
+    boards = []
+    for filename in sorted(glob.glob('board_*.txt')):
+        try:
+            read_board(filename)
+        except IOError:
+            continue
+        boards.append(filename)
+    return boards
+
+
+def run_tournament(boards: list[str], games: int, white: str, black: str,
+                   max_plies: int = 200, seed: int = 0,
+                   workers: Optional[int] = None) -> dict[str, Any]:
+    '''Plays games seeded games on each board, seeds counting up from
+    seed, across a pool of worker processes (default one per CPU) and
+    returns the statistics for each board and overall. Results depend
+    only on the seeds, not on how games are shared out.
+    Example:
+    >>> stats = run_tournament(['board_small_valid.txt'], 4, 'random',
+    ...                        'random', 50, workers=2)
+    >>> stats['total']['games'], stats['total']['white_win_rate']
+    (4, 0.5)
+    '''
+    for strategy in (white, black):
+        make_policy(strategy, 0)  # fail early on unknown strategies
+    tasks = [(filename, seed + i, white, black, max_plies)
+             for filename in boards for i in range(games)]
+    start = time.perf_counter()
+    with Pool(workers) as pool:
+        results = pool.map(play_task, tasks, chunksize=1)
+    seconds = time.perf_counter() - start
+    return {
+        'white': white,
+        'black': black,
+        'max_plies': max_plies,
+        'seed': seed,
+        'seconds': round(seconds, 6),
+        'games_per_second': len(results) / seconds if seconds > 0 else 0.0,
+        'boards': {filename: summarise([r for r in results
+                                        if r['board'] == filename])
+                   for filename in boards},
+        'total': summarise(results),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play seeded games on each board across processes '
+        + 'and print statistics as JSON')
+    parser.add_argument('boards', nargs='*',
+                        help='board files, default every valid '
+                        + 'board_*.txt')
+    parser.add_argument('--games', type=int, default=10,
+                        help='games per board')
+    parser.add_argument('--white', default='random',
+                        help="White's strategy: random or search:N")
+    parser.add_argument('--black', default='random',
+                        help="Black's strategy: random or search:N")
+    parser.add_argument('--max-plies', type=int, default=200,
+                        help='moves after which a game counts as a '
+                        + 'timeout')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game on each board')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='processes to use, default one per CPU')
+    args = parser.parse_args()
+    stats = run_tournament(args.boards or default_boards(), args.games,
+                           args.white, args.black, args.max_plies,
+                           args.seed, args.workers)
+    print(json.dumps(stats, indent=2))